@@ -0,0 +1,172 @@
+''' Модуль пакета заранее подготовленных картинок игры
+Сборка пакета (выполняется один раз, после изменения картинок):
+
+    python assetpack.py build [--out assets.pack]
+
+Основной функционал модуля:
+- чтение картинок из папок images и emotions так же, как это делает игра;
+- сохранение в один файл пикселей в формате экрана (BGRA, 32 бит)
+  в исходном размере и в размерах, в которых картинки показываются в игре;
+- открытие пакета через mmap и создание холстов прямо поверх его памяти
+  (pygame.image.frombuffer) без декодирования и копирования: класс AssetPack;
+- подключение пакета для всей игры: функция open_pack;
+
+Формат файла: сигнатура, версия, длина индекса, индекс в JSON,
+затем пиксели картинок, каждая выровнена на 16 байт; смещения в индексе
+отсчитываются от начала пикселей.
+Звуки в пакет не входят - они читаются модулем sounds.
+'''
+import argparse
+import json
+import mmap
+import os
+import struct
+import numpy as np
+import pygame
+
+MAGIC = b'QPAK'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+ALIGN = 16
+PIXEL_FORMAT = 'BGRA'
+
+# размеры, в которых картинки показываются в игре (см. game.py):
+# машинки - в сотах поля (радиус 50) и в кнопке хода (радиус 80), лица - в окошке аватара
+CAR_SIZES = [(int(np.sqrt(3) * radius),) * 2 for radius in (50, 80)]
+FACE_SIZE = (158, 158)
+PACK_IMAGES = {'initface.jpg': [FACE_SIZE],
+               'redcar.png': CAR_SIZES,
+               'bluecar.jpg': CAR_SIZES}
+
+# подключенный пакет; None - картинки читаются из файлов
+active_pack = None
+
+
+def pack_key(section, relname):
+    ''' ключ картинки в пакете: "раздел/путь внутри папки раздела" '''
+    return section + '/' + relname.replace('\\', '/')
+
+
+def size_key(key, size):
+    return f'{key}@{size[0]}x{size[1]}'
+
+
+class AssetPack:
+    def __init__(self, filename):
+        ''' открыть пакет; холсты создаются при первом обращении поверх памяти файла '''
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_len = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Файл '{filename}' не является пакетом картинок версии {VERSION}")
+        self.index = json.loads(bytes(self.mm[HEADER.size:HEADER.size + index_len]))
+        # смещения в индексе отсчитываются от начала пикселей
+        self.base = HEADER.size + index_len
+        self.surfaces = {}
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def is_fresh(self, key, fullname):
+        ''' картинка в пакете собрана из текущей версии файла fullname '''
+        entry = self.index.get(key)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(fullname)
+        except OSError:
+            return False
+        return entry['mtime'] == int(stat.st_mtime) and entry['bytes'] == stat.st_size
+
+    def get(self, key, size=None):
+        ''' холст картинки key исходного размера или размера size '''
+        if size is not None:
+            key = size_key(key, size)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            entry = self.index[key]
+            offset, length = self.base + entry['offset'], entry['length']
+            surface = pygame.image.frombuffer(memoryview(self.mm)[offset:offset + length],
+                                              tuple(entry['size']), PIXEL_FORMAT)
+            self.surfaces[key] = surface
+        return surface
+
+    def get_sizes(self, key):
+        ''' размеры, в которых картинка key заранее подготовлена '''
+        return [tuple(size) for size in self.index[key].get('sizes', [])]
+
+
+def open_pack(filename):
+    ''' подключить пакет для всей игры; вернуть его или None, если файла нет '''
+    global active_pack
+    if not os.path.isfile(filename):
+        print(f"Пакет картинок '{filename}' не найден, картинки читаются из файлов")
+        return None
+    active_pack = AssetPack(filename)
+    return active_pack
+
+
+def load_colorkey_image(fullname):
+    ''' прочитать картинку так же, как игра: формат экрана и цвет фона из угла '''
+    image = pygame.image.load(fullname).convert()
+    image.set_colorkey(image.get_at((0, 0)))
+    return image
+
+
+def build_pack(out, images_path='images', emotions_path='emotions'):
+    ''' собрать пакет out из папок картинок и эмоций '''
+    from emotions import ImagesData
+
+    sources = []  # (ключ, файл, размеры)
+    for name, sizes in PACK_IMAGES.items():
+        sources.append((pack_key('images', name), os.path.join(images_path, name), sizes))
+    emotions = ImagesData(emotions_path)
+    for file_list in emotions.index.values():
+        for fullname in file_list:
+            relname = os.path.relpath(fullname, emotions_path)
+            sources.append((pack_key('emotions', relname), fullname, [FACE_SIZE]))
+
+    index, blobs, offset = {}, [], 0
+
+    def add(key, surface, **info):
+        nonlocal offset
+        data = pygame.image.tobytes(surface.convert_alpha(), PIXEL_FORMAT)
+        index[key] = dict(info, offset=offset, length=len(data), size=surface.get_size())
+        padding = -len(data) % ALIGN
+        blobs.append(data + b'\0' * padding)
+        offset += len(data) + padding
+
+    for key, fullname, sizes in sources:
+        image = load_colorkey_image(fullname)
+        stat = os.stat(fullname)
+        add(key, image, sizes=sizes, mtime=int(stat.st_mtime), bytes=stat.st_size)
+        for size in sizes:
+            add(size_key(key, size), pygame.transform.scale(image, size))
+
+    # индекс добиваем пробелами, чтобы пиксели начинались с выровненного адреса
+    index_data = json.dumps(index).encode('utf-8')
+    index_data += b' ' * (-(HEADER.size + len(index_data)) % ALIGN)
+
+    with open(out, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index_data)))
+        f.write(index_data)
+        for blob in blobs:
+            f.write(blob)
+    return len(index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сборка пакета картинок игры')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--out', default='assets.pack', help='файл пакета')
+    parser.add_argument('--images', default='images', help='папка картинок')
+    parser.add_argument('--emotions', default='emotions', help='папка эмоций')
+    args = parser.parse_args()
+
+    # для перевода картинок в формат экрана нужно окно, хотя бы невидимое
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    count = build_pack(args.out, args.images, args.emotions)
+    print(f"Собран пакет '{args.out}': {count} холстов, {os.path.getsize(args.out)} байт")
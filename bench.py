@@ -0,0 +1,266 @@
+''' Набор замеров производительности игры (без окна и звука)
+Запуск из папки игры:
+
+    python bench.py [--groups render assets questions game] [--only шаблон]
+                    [--repeat N] [--save файл.json] [--baseline файл.json]
+
+Основной функционал модуля:
+- замеры построения поля Board, обновления досок InfoBoard и QuestBoard,
+  раскладки длинных текстов TextCell.draw_text;
+- замеры чтения картинок ImagesData и звуков SoundData;
+- замеры чтения банка вопросов QuestData, выбора вопроса и проверки ответа
+  на банках нескольких размеров;
+- замер целой игры по сценарию через Game.change_state;
+- вывод результатов в JSON и сравнение с сохраненным эталоном (baseline):
+  если какой-то замер медленнее эталона больше чем в --tolerance раз,
+  программа завершается с кодом 1;
+
+Для каждого замера сохраняются минимальное и медианное время одного прогона, мс.
+'''
+import os
+# окно и звук не нужны - используем пустые драйверы SDL
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import pygame
+
+BANK_SIZES = (1000, 10000, 100000)
+LONG_TEXT = ('Сколько лет прошло с того дня, когда команда впервые собралась вместе '
+             'за большим столом, чтобы ответить на самые длинные и запутанные вопросы '
+             'о детстве, школе, друзьях и путешествиях нашей замечательной Тани? ') * 2
+
+
+def timeit(func, repeat, setup=None):
+    ''' время прогонов func, мс; setup вызывается перед каждым прогоном и не замеряется '''
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        times.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': min(times), 'median_ms': statistics.median(times), 'runs': repeat}
+
+
+def make_bank(path, size, seed=0):
+    ''' сгенерировать файл вопросов на size строк в формате quest.csv '''
+    rnd = random.Random(seed)
+    words = LONG_TEXT.replace(',', '').replace('?', '').split()
+    with open(path, 'w', encoding='windows-1251') as f:
+        f.write('level;question;answer1;answer2;answer3\n')
+        for n in range(size):
+            question = f'Вопрос {n}: ' + ' '.join(rnd.choices(words, k=12)) + '?'
+            answers = [' '.join(rnd.choices(words, k=4)) for _ in range(3)]
+            f.write(f'{n % 4};{question};' + ';'.join(answers) + '\n')
+
+
+def bench_render(repeat):
+    import sotes
+    from sotes import Board
+    from quest_screen import QuestBoard, TextCell, text_layout
+    from fonts import text_render
+    from game import InfoBoard
+
+    screen = pygame.display.get_surface()
+    results = {}
+
+    def clear_caches(_=None):
+        sotes.baked_cells.clear()
+        sotes.scaled_images.clear()
+        text_render.clear()
+        text_layout.layouts.clear()
+
+    def make_board(_):
+        # поле 5х5, как в Game._init_board_
+        txt_names = ['S', 'M', 'L', 'XL', 'V']
+        clr_names = ['#D0A0A088', '#D0A0A088', 'grey', '#A0A0D088', '#A0A0D088']
+        texts = [[name] * 5 for name in txt_names]
+        colors = [clr_names for _ in txt_names]
+        board = Board(texts, colors, left=500, top=200, cell_size=100)
+        board.cell_sprites.update(None)
+        board.cell_sprites.draw(screen)
+    results['board_construct_cold'] = timeit(make_board, repeat, clear_caches)
+    results['board_construct_warm'] = timeit(make_board, repeat)
+
+    infoboard = InfoBoard('Вспомнить ВСЕ вместе с Таней')
+
+    def info_frame(_):
+        infoboard.res_sprite.next_status()
+        infoboard.info_sprites.update(None)
+        infoboard.info_sprites.draw(screen)
+    results['infoboard_update'] = timeit(info_frame, repeat * 10)
+
+    texts = ['Вопрос', 'Ответ 1', 'Ответ 2', 'Ответ 3']
+    questboard = QuestBoard(texts, left=30, top=270, width=400, head_height=50, height=110)
+    counter = iter(range(10 ** 9))
+
+    def new_question(_):
+        # новый текст каждый раз - раскладка и отрисовка с нуля
+        n = next(counter)
+        questboard.add_question([f'{n}. {LONG_TEXT}'] + [f'{n}.{k} {LONG_TEXT[:80]}' for k in range(3)])
+        questboard.quest_sprites.update(None)
+        questboard.quest_sprites.draw(screen)
+    results['questboard_new_question'] = timeit(new_question, repeat * 5)
+
+    def prerender_question():
+        # следующий вопрос рисуется заранее, пока команда отвечает (не замеряется)
+        n = next(counter)
+        texts = [f'{n}. {LONG_TEXT}'] + [f'{n}.{k} {LONG_TEXT[:80]}' for k in range(3)]
+        questboard.prerender(texts)
+        return texts
+
+    def show_prerendered(texts):
+        questboard.add_question(texts)
+        questboard.quest_sprites.update(None)
+        questboard.quest_sprites.draw(screen)
+    results['questboard_prerendered_question'] = timeit(show_prerendered, repeat * 5,
+                                                        prerender_question)
+
+    def click_answer(_):
+        # смена цвета ответа - строки уже в кэше
+        questboard.quest_sprites.update(questboard.cells[1].rect.center)
+        questboard.quest_sprites.draw(screen)
+    results['questboard_click'] = timeit(click_answer, repeat * 10)
+
+    sprites = pygame.sprite.Group()
+    cell = TextCell(sprites, 0, 0, 400, 300, 30)
+
+    def draw_long_cold(_):
+        cell.add_text(f'{next(counter)} {LONG_TEXT}')
+        cell.draw_text()
+    results['draw_text_long_cold'] = timeit(draw_long_cold, repeat * 5)
+
+    def draw_long_warm(_):
+        cell.next_status()
+        cell.draw_text()
+    results['draw_text_long_toggle'] = timeit(draw_long_warm, repeat * 10)
+    return results
+
+
+def bench_assets(repeat):
+    from emotions import ImagesData
+    from sounds import SoundData
+
+    results = {}
+    results['images_load_all'] = timeit(lambda _: ImagesData(lazy=False), repeat)
+    results['images_first_level'] = timeit(lambda _: ImagesData().get_image(0, 0), repeat)
+    results['sounds_load_preload'] = timeit(lambda _: SoundData(preload=True), max(repeat // 2, 1))
+    sounds = SoundData(preload=True)
+    results['sounds_play'] = timeit(lambda _: sounds.play_sound(4), repeat * 10)
+    return results
+
+
+def bench_questions(repeat, tmpdir):
+    from questions import QuestData
+
+    results = {}
+    for size in BANK_SIZES:
+        filename = f'bank_{size}.csv'
+        make_bank(os.path.join(tmpdir, filename), size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[f'quest_load_{size}'] = timeit(
+                lambda _: QuestData(filename, tmpdir, seed=0), max(repeat // 2, 1))
+            qdata = QuestData(filename, tmpdir, seed=0)
+            draws = iter(range(10 ** 9))
+
+            def draw(_):
+                qid, perm = qdata.get_next_quest(next(draws) % 4)
+                qdata.get_quest_texts(qid, perm)
+            results[f'quest_draw_{size}'] = timeit(draw, repeat * 20)
+            qid, perm = qdata.get_next_quest(0)
+            texts = qdata.get_quest_texts(qid, perm)
+            results[f'quest_check_id_{size}'] = timeit(
+                lambda _: qdata.is_it_right(qid, perm[0]), repeat * 20)
+            results[f'quest_check_text_{size}'] = timeit(
+                lambda _: qdata.is_it_right(texts[0], texts[1]), repeat * 20)
+    return results
+
+
+def bench_game(repeat):
+    from game import Game
+
+    def play(game):
+        ''' сценарий: всегда 1-й ответ, пока кто-то не победит '''
+        ctrl = game.infoboard.res_sprite.center
+        answer = game.questboard.cells[1].rect.center
+        for _ in range(100):
+            for pos in (ctrl, answer, ctrl, ctrl):
+                game.questboard.quest_sprites.update(pos)
+                game.change_state(pos)
+                game.board.cell_sprites.update(None)
+            if game.infoboard.res_sprite.status == 5:
+                break
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {'game_construct': timeit(lambda _: Game(seed=0), max(repeat // 2, 1)),
+                'game_scripted': timeit(play, repeat, lambda: Game(seed=0))}
+
+
+def compare(results, baseline, tolerance):
+    ''' сравнить медианы с эталоном; вернуть список замедлившихся замеров '''
+    slower = []
+    for name, result in sorted(results.items()):
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f'{name:32s} {result["median_ms"]:10.3f} мс   (нет в эталоне)')
+            continue
+        ratio = result['median_ms'] / max(base['median_ms'], 1e-6)
+        mark = ' <-- медленнее' if ratio > tolerance else ''
+        print(f'{name:32s} {result["median_ms"]:10.3f} мс  эталон {base["median_ms"]:10.3f} мс'
+              f'  x{ratio:5.2f}{mark}')
+        if ratio > tolerance:
+            slower.append(name)
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Замеры производительности игры')
+    parser.add_argument('--groups', nargs='+', default=['render', 'assets', 'questions', 'game'],
+                        choices=['render', 'assets', 'questions', 'game'], help='группы замеров')
+    parser.add_argument('--only', default='*', help='шаблон имен замеров, например "quest_*"')
+    parser.add_argument('--repeat', type=int, default=10, help='базовое число прогонов')
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='сравнить с результатами из JSON')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='допустимое замедление относительно эталона, раз')
+    args = parser.parse_args()
+
+    # пути к картинкам, звукам и вопросам в игре заданы относительно ее папки
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+    pygame.display.set_mode((1000, 800))
+
+    groups = {'render': lambda: bench_render(args.repeat),
+              'assets': lambda: bench_assets(args.repeat),
+              'questions': lambda: bench_questions(args.repeat, tmpdir),
+              'game': lambda: bench_game(args.repeat)}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for group in args.groups:
+            results.update(groups[group]())
+    results = {name: r for name, r in results.items() if fnmatch.fnmatch(name, args.only)}
+
+    report = {'meta': {'python': platform.python_version(), 'pygame': pygame.version.ver,
+                       'platform': platform.platform(), 'repeat': args.repeat,
+                       'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+              'results': results}
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        pygame.quit()
+        sys.exit(1 if slower else 0)
+    print(json.dumps(report, ensure_ascii=False, indent=1))
+    pygame.quit()
@@ -5,28 +5,47 @@
 - столбцы соответствуют видам эмоций: 0 - норм, 1 - радость, 2 - испуг, ...
 
 Основной функционал модуля (класса ImagesData):
-- загрузка картинок лиц из папки path в список imagelist;
-- подготовка двумерного массивы np.array доступа к картинкам;
+- составление индекса файлов картинок лиц из папки path без их чтения;
+- чтение (декодирование) картинок при первом обращении к ним;
+- фоновое чтение картинок следующего уровня в пуле потоков;
+- чтение картинок уровня в чужом потоке и их подготовка в основном: методы read_level и store_decoded;
+- ограничение памяти под прочитанные картинки (давно не использованные вытесняются);
+- использование готовых картинок из подключенного пакета (модуль assetpack);
 - получение картинки по параметрам (row, col);
+- перечитывание одной эмоции после изменения ее файлов: метод reload;
 
 '''
 import numpy as np
 import os
 import pygame
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import assetpack
+from sotes import scaled_images
 
 
 class ImagesData:
-    def __init__(self, path='.\emotions'):
-        ''' Чтение файлов из папки path; в папке могут быть только картинки и папки '''
-        self.image_dict = self.load_images_from_dir_to_dict(path)
-        # формируем список папок для анимации
-        file_list = os.listdir(path)
-        dir_list = [x for x in file_list if os.path.isdir(os.path.join(path, x))]
-        dir_list = [x for x in dir_list if self.get_rowcol(x) is not None]
-        if dir_list:
-            for dirname in dir_list:
-                row_col = self.get_rowcol(dirname)
-                self.image_dict[row_col] = self.load_images_from_dir_to_list(os.path.join(path, dirname))
+    def __init__(self, path=os.path.join('.', 'emotions'), lazy=True,
+                 max_bytes=64 * 1024 * 1024, workers=2):
+        ''' Чтение списка файлов из папки path; в папке могут быть только картинки и папки
+        :param lazy: читать картинки только при первом обращении; иначе - все сразу
+        :param max_bytes: предельный объем памяти под прочитанные картинки
+        :param workers: количество потоков фонового чтения
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.executor = None
+        # (row, col) -> список файлов кадров
+        self.index = self.index_images(path)
+        # (row, col) -> список готовых картинок, в порядке последнего использования
+        self.image_dict = OrderedDict()
+        # (row, col) -> фоновое чтение картинок (Future)
+        self.pending = {}
+        self.used_bytes = 0
+        if not lazy:
+            for row, col in self.index:
+                self.get_image(row, col)
 
     def get_rowcol(self, name):
         namelist = name.split('.')
@@ -54,47 +73,148 @@ class ImagesData:
         except:
             return None
 
-    def load_images_from_dir_to_list(self, path):
-        ''' Чтение файлов из папки path; читаются как картинки только файлы,
-        название которых имеет вид "name_order.*"; здесь order показывает очередность
-        анимации картинок
+    def index_images(self, path):
+        ''' Составление индекса файлов без их чтения:
+        - файлы вида "name_row_col.ext" дают по одной картинке;
+        - папки вида "name_row_col" дают анимацию из файлов "name-order.*" в порядке order
         '''
-        # получаем и фильтруем список файлов
-        file_list = os.listdir(path)
-        file_list = [x for x in file_list if os.path.isfile(os.path.join(path, x))]
-        file_list = [x for x in file_list if self.get_order(x) is not None]
-        # формируем список картинок из отобранных файлов
+        index = {}
+        for name in os.listdir(path):
+            row_col = self.get_rowcol(name)
+            if row_col is None:
+                continue
+            fullname = os.path.join(path, name)
+            if os.path.isfile(fullname):
+                index.setdefault(row_col, [fullname])
+            elif os.path.isdir(fullname):
+                file_list = [x for x in os.listdir(fullname)
+                             if os.path.isfile(os.path.join(fullname, x))
+                             and self.get_order(x) is not None]
+                file_list.sort(key=self.get_order)
+                # анимация из папки важнее одиночной картинки
+                index[row_col] = [os.path.join(fullname, x) for x in file_list]
+        return index
+
+    @staticmethod
+    def read_images(file_list):
+        ''' декодирование файлов; convert() здесь не делаем - он возможен только
+        в основном потоке после создания окна '''
+        return [pygame.image.load(fullname) for fullname in file_list]
+
+    def prepare(self, images):
         imagelist = []
-        for filename in file_list:
-            fullname = os.path.join(path, filename)
-            image = pygame.image.load(fullname)
+        for image in images:
             image = image.convert()
             colorkey = image.get_at((0, 0))
             image.set_colorkey(colorkey)
             imagelist.append(image)
         return imagelist
 
-    def load_images_from_dir_to_dict(self, path):
-        ''' Чтение файлов из папки path; читаются как картинки только файлы,
-        название которых имеют вид "name_row_col.ext" '''
-        imagedict = {}
-        # получаем и фильтруем список файлов
-        file_list = os.listdir(path)
-        file_list = [x for x in file_list if os.path.isfile(os.path.join(path, x))]
-        filelist = [x for x in file_list if self.get_rowcol(x) is not None]
-        # формируем список картинок из отобранных файлов
-        for filename in filelist:
-            row_col = self.get_rowcol(filename)
-            fullname = os.path.join(path, filename)
-            image = pygame.image.load(fullname)
-            image = image.convert()
-            colorkey = image.get_at((0, 0))
-            image.set_colorkey(colorkey)
-            imagedict[row_col] = [image]
-        return imagedict
+    def pack_keys(self, file_list):
+        ''' ключи картинок в подключенном пакете или None, если их там нет '''
+        pack = assetpack.active_pack
+        if pack is None:
+            return None
+        keys = [assetpack.pack_key('emotions', os.path.relpath(fullname, self.path))
+                for fullname in file_list]
+        if not all(pack.is_fresh(key, fullname) for key, fullname in zip(keys, file_list)):
+            return None
+        return keys
+
+    def packed_images(self, file_list):
+        ''' готовые картинки из подключенного пакета или None, если их там нет '''
+        keys = self.pack_keys(file_list)
+        if keys is None:
+            return None
+        return [scaled_images.add_packed(assetpack.active_pack, key) for key in keys]
+
+    def read_level(self, level):
+        ''' декодировать картинки уровня level (можно в фоновом потоке, convert() не делается);
+        картинки из пакета не читаются - их подключает prefetch
+        :return: {(row, col): картинки} для метода store_decoded в основном потоке
+        '''
+        return {row_col: self.read_images(file_list) for row_col, file_list in self.index.items()
+                if row_col[0] == level and self.pack_keys(file_list) is None}
+
+    def store_decoded(self, decoded):
+        for row_col, images in decoded.items():
+            if row_col not in self.image_dict:
+                self.store(row_col, self.prepare(images))
+
+    def prefetch(self, level):
+        ''' начать фоновое чтение всех эмоций уровня level '''
+        if self.used_bytes >= self.max_bytes:
+            return
+        for row_col, file_list in self.index.items():
+            if row_col[0] != level or row_col in self.image_dict or row_col in self.pending:
+                continue
+            packed = self.packed_images(file_list)
+            if packed is not None:
+                self.store(row_col, packed)
+                continue
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            self.pending[row_col] = self.executor.submit(self.read_images, file_list)
+
+    def store(self, row_col, imagelist):
+        self.image_dict[row_col] = imagelist
+        self.used_bytes += sum(image.get_pitch() * image.get_height() for image in imagelist)
+        # вытесняем давно не использованные картинки, последнюю оставляем всегда
+        while self.used_bytes > self.max_bytes and len(self.image_dict) > 1:
+            _, old = self.image_dict.popitem(last=False)
+            self.forget(old)
+        return imagelist
+
+    def forget(self, imagelist):
+        ''' освободить вытесненные картинки вместе с их масштабированными вариантами '''
+        self.used_bytes -= sum(image.get_pitch() * image.get_height() for image in imagelist)
+        for image in imagelist:
+            scaled_images.forget(image)
+
+    def loaded(self):
+        ''' уже прочитанные картинки, включая законченные фоновые чтения '''
+        for row_col in [key for key, future in self.pending.items() if future.done()]:
+            self.store(row_col, self.prepare(self.pending.pop(row_col).result()))
+        return list(self.image_dict.values())
 
     def get_image(self, row, col):
-        return self.image_dict[(row, col)]
+        row_col = (row, col)
+        if row_col in self.image_dict:
+            self.image_dict.move_to_end(row_col)
+            return self.image_dict[row_col]
+        future = self.pending.pop(row_col, None)
+        if future is not None:
+            images = future.result()
+        else:
+            packed = self.packed_images(self.index[row_col])
+            if packed is not None:
+                return self.store(row_col, packed)
+            images = self.read_images(self.index[row_col])
+        return self.store(row_col, self.prepare(images))
+
+    def reload(self, row_col):
+        ''' забыть картинки эмоции row_col, чтобы при следующем обращении прочитать их
+        из измененных файлов; индекс файлов составляется заново (без чтения картинок) '''
+        index = self.index_images(self.path)
+        if row_col not in index:
+            # файлы эмоции удалены - оставляем прежние картинки, пока не появятся новые
+            index[row_col] = self.index[row_col]
+            self.index = index
+            return
+        self.index = index
+        future = self.pending.pop(row_col, None)
+        if future is not None:
+            future.cancel()
+        old = self.image_dict.pop(row_col, None)
+        if old is not None:
+            self.forget(old)
+
+    def close(self):
+        if self.executor is not None:
+            for future in self.pending.values():
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            self.executor = None
 
 
 if __name__ == '__main__':
@@ -106,9 +226,9 @@ if __name__ == '__main__':
 
     imdata = ImagesData()
     if imdata:
-        print(imdata.filelist)
-        print(imdata.access)
-        image = imdata.get_image(0, 1)
+        print(imdata.index)
+        imdata.prefetch(1)
+        image = imdata.get_image(0, 1)[0]
         screen.blit(image, (100, 10))
 
     running = True
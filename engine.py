@@ -0,0 +1,208 @@
+''' Модуль состояния игры без отображения (без pygame)
+Игра - это конечный автомат с состоянием кнопки управления (как в Game):
+0 - Start, 1 - Вопрос, 2 - '.???.' (ответ выбран), 3 - неверно, 4 - верно, 5 - победа.
+
+Действия игроков (по одному символу, из них и составляется запись игры):
+- 'S' - задать вопрос (кнопка управления в состоянии 0);
+- '1'...'9' - выбрать ответ N (в состоянии 1);
+- 'C' - проверить выбранный ответ (кнопка управления в состоянии 2);
+- 'A' - сделать ход и передать его другому игроку (кнопка управления в состоянии 3 или 4);
+недопустимое в текущем состоянии действие игнорируется, как и нажатие не той кнопки.
+
+Основной функционал модуля:
+- выполнение действий и выдача списка переходов для отображения: класс GameEngine;
+- заблаговременный выбор вопроса следующего игрока: метод GameEngine.prefetch;
+- запись игры: номер инициализации выбора вопросов (seed), строка действий и итог;
+- воспроизведение записей без окна: функции replay и replay_file;
+
+Пример: проверить, что записанные игры воспроизводятся с тем же итогом
+
+    python engine.py replay games.jsonl --quest quest.csv
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+from questions import QuestData
+from hexboard import MoveTable, start_cols
+
+CONTROL_ACTIONS = {0: 'S', 2: 'C', 3: 'A', 4: 'A'}
+
+
+class GameEngine:
+    def __init__(self, qdata, nrows=5, nplayers=2, seed=None):
+        ''' состояние игры
+        :param qdata: объект QuestData; при повторе игры выбор вопросов должен быть
+                      инициализирован тем же seed, что и при записи
+        :param nrows: количество рядов поля; побеждает дошедший до последнего
+        :param nplayers: количество игроков (дорожки поля см. модуль hexboard)
+        :param seed: записывается в запись игры для ее повтора
+        '''
+        self.qdata = qdata
+        self.nrows = nrows
+        self.seed = seed
+        self.moves = MoveTable(nrows, nplayers)
+        # на поле выше банка вопросы верхних рядов берутся из самого сложного уровня
+        self.top_level = max(qdata.qdict, default=0)
+        self.players_state = {n: [0, col] for n, col in enumerate(start_cols(nplayers))}
+        self.player_n = 0
+        self.status = 0
+        # номер заданного вопроса, порядок показа его ответов и выбранный ответ
+        self.qid, self.qperm = None, None
+        # заранее выбранный вопрос следующего игрока: (игрок, уровень пула, номер, перестановка)
+        self.next_quest = None
+        self.choice = 0
+        self.actions = []
+
+    def control_action(self):
+        ''' действие кнопки управления в текущем состоянии или None '''
+        return CONTROL_ACTIONS.get(self.status)
+
+    def apply(self, action):
+        ''' выполнить действие; вернуть список переходов (словарей с ключом 'type'):
+        question - задан вопрос, choice - выбран ответ, answer - проверен ответ,
+        move - ход игрока, turn - смена игрока, status - новое состояние кнопки управления
+        (с уровнем level, по которому выбирается эмоция)
+        '''
+        if action == 'S' and self.status == 0:
+            transitions = self.start()
+        elif action.isdigit() and self.status == 1 and 0 < int(action) <= self.qdata.answers_n:
+            transitions = self.choose(int(action))
+        elif action == 'C' and self.status == 2:
+            transitions = self.confirm()
+        elif action == 'A' and self.status in (3, 4):
+            transitions = self.advance()
+        else:
+            return []
+        self.actions.append(action)
+        self.status = transitions[-1]['status']
+        return transitions
+
+    def prefetch(self):
+        ''' пока игрок отвечает, заранее выбрать вопрос следующего игрока (его уровень
+        до начала его хода не меняется); выбор вопросов идет в том же порядке, что и без
+        этого, поэтому записи игр повторяются одинаково
+        Единственному игроку вопрос заранее не выбирается: его уровень меняется ходом,
+        и выбранный вопрос пришлось бы вернуть, а лишний выбор сбил бы повтор записи
+        :return: тексты вопроса и ответов для заблаговременной отрисовки или None
+        '''
+        if self.status not in (1, 2) or self.next_quest is not None:
+            return None
+        player_n = (self.player_n + 1) % len(self.players_state)
+        if player_n == self.player_n:
+            return None
+        level = min(self.players_state[player_n][0], self.top_level)
+        qid, perm = self.qdata.get_next_quest(level=level)
+        self.next_quest = (player_n, level, qid, perm)
+        return self.qdata.get_quest_texts(qid, perm)
+
+    def cancel_prefetch(self):
+        ''' вернуть заранее выбранный вопрос в пул неотвеченных '''
+        if self.next_quest is not None:
+            _, level, qid, _ = self.next_quest
+            self.next_quest = None
+            if qid is not None:
+                self.qdata.put_back(level, qid)
+
+    def start(self):
+        level, _ = self.players_state[self.player_n]
+        quest_level = min(level, self.top_level)
+        if self.next_quest is not None and self.next_quest[:2] == (self.player_n, quest_level):
+            _, _, self.qid, self.qperm = self.next_quest
+            self.next_quest = None
+        else:
+            self.cancel_prefetch()
+            self.qid, self.qperm = self.qdata.get_next_quest(level=quest_level)
+        texts = self.qdata.get_quest_texts(self.qid, self.qperm)
+        return [{'type': 'question', 'player': self.player_n, 'level': level,
+                 'qid': self.qid, 'texts': texts},
+                {'type': 'status', 'status': 1, 'level': level}]
+
+    def choose(self, choice):
+        self.choice = choice
+        level, _ = self.players_state[self.player_n]
+        return [{'type': 'choice', 'choice': choice},
+                {'type': 'status', 'status': 2, 'level': level}]
+
+    def confirm(self):
+        level, _ = self.players_state[self.player_n]
+        right = self.qid is not None and \
+            self.qdata.is_it_right(self.qid, self.qperm[self.choice - 1])
+        return [{'type': 'answer', 'player': self.player_n, 'qid': self.qid,
+                 'choice': self.choice, 'right': right},
+                {'type': 'status', 'status': 4 if right else 3, 'level': level}]
+
+    def advance(self):
+        level, col = self.players_state[self.player_n]
+        newlevel, newcol = self.moves.move(self.player_n, level, col, self.status == 4)
+        self.players_state[self.player_n] = [newlevel, newcol]
+        self.choice = 0
+        transitions = [{'type': 'move', 'player': self.player_n,
+                        'from': (level, col), 'to': (newlevel, newcol)}]
+        if newlevel == self.nrows - 1:
+            # Виктория! заранее выбранный вопрос уже не понадобится
+            self.cancel_prefetch()
+            return transitions + [{'type': 'status', 'status': 5, 'level': newlevel}]
+        self.player_n = (self.player_n + 1) % len(self.players_state)
+        # эмоция после хода - по уровню того, кто ходил
+        return transitions + [{'type': 'turn', 'player': self.player_n},
+                              {'type': 'status', 'status': 0, 'level': newlevel}]
+
+    def winner(self):
+        return self.player_n if self.status == 5 else None
+
+    def record(self):
+        ''' запись игры: seed, строка действий и итог для проверки повтора '''
+        return {'seed': self.seed, 'rows': self.nrows, 'players': len(self.players_state),
+                'actions': ''.join(self.actions),
+                'winner': self.winner(),
+                'positions': [self.players_state[n] for n in sorted(self.players_state)]}
+
+
+def replay(record, qdata):
+    ''' повторить запись игры на qdata (выбор вопросов перезапускается с seed записи) '''
+    qdata.reset(record['seed'])
+    engine = GameEngine(qdata, record.get('rows', 5), record.get('players', 2), record['seed'])
+    for action in record['actions']:
+        if not engine.apply(action):
+            raise ValueError(f'Недопустимое действие {action!r} в состоянии {engine.status}')
+    return engine
+
+
+def replay_file(filename, qdata):
+    ''' повторить все игры из файла записей (по одной записи JSON в строке)
+    :return: отчет - количество игр, победы игроков, расхождения с записанным итогом
+    '''
+    report = {'games': 0, 'wins': {}, 'mismatches': []}
+    with open(filename, encoding='utf-8') as f, contextlib.redirect_stdout(io.StringIO()):
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            result = replay(record, qdata).record()
+            report['games'] += 1
+            report['wins'][result['winner']] = report['wins'].get(result['winner'], 0) + 1
+            if (result['winner'], result['positions']) != (record['winner'], record['positions']):
+                report['mismatches'].append(n)
+    return report
+
+
+def save_record(filename, record):
+    ''' дописать запись игры в файл записей '''
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных игр без окна')
+    parser.add_argument('command', choices=['replay'])
+    parser.add_argument('games', help='файл записей игр (game.py --record)')
+    parser.add_argument('--quest', default='quest.csv', help='файл вопросов в папке data')
+    args = parser.parse_args()
+
+    qdata = QuestData(args.quest, os.path.join('.', 'data'))
+    report = replay_file(args.games, qdata)
+    print(f"игр: {report['games']}, победы: {report['wins']}")
+    if report['mismatches']:
+        print(f"итог не совпал в строках: {report['mismatches']}")
@@ -0,0 +1,69 @@
+''' Модуль общего сервиса отрисовки текста
+Основной функционал модуля (класса TextRender):
+- хранение одного шрифта pygame.font.Font на каждый размер;
+- кэширование отрисованных надписей по ключу (текст, размер, цвет, сглаживание);
+- вытеснение давно не использованных надписей при превышении лимита памяти (LRU);
+- счетчики попаданий/промахов кэша для оценки его работы;
+
+Готовые надписи общие для всех модулей, поэтому их нельзя изменять на месте -
+только копировать (blit) или масштабировать в новый холст.
+'''
+import pygame
+from collections import OrderedDict
+
+
+class TextRender:
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        ''' :param max_bytes: предельный объем памяти под отрисованные надписи '''
+        self.max_bytes = max_bytes
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.font_creations = 0
+
+    def get_font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+            self.font_creations += 1
+        return font
+
+    def render(self, text, size, color, antialias=True):
+        ''' получить надпись text шрифтом размера size цветом color
+        :return: холст (surface) с надписью; изменять его нельзя
+        '''
+        key = (text, size, tuple(pygame.Color(color)), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.get_font(size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        self.used_bytes += self.surface_bytes(surface)
+        # вытесняем самые старые надписи, но последнюю оставляем всегда
+        while self.used_bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.used_bytes -= self.surface_bytes(old)
+        return surface
+
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_pitch() * surface.get_height()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'fonts': len(self.fonts), 'font_creations': self.font_creations,
+                'surfaces': len(self.surfaces), 'bytes': self.used_bytes}
+
+    def clear(self):
+        self.surfaces.clear()
+        self.used_bytes = 0
+
+
+# общий для всей игры сервис отрисовки текста
+text_render = TextRender()
@@ -4,28 +4,69 @@
 - инициация группы спрайтов "доска квеста игры";
 - инициация группы спрайтов "информационное поле игры";
 - создание агентов команд игроков;
-- инициация игры;
-- проверка условия завершения игры;
+- поиск цели нажатия мыши за O(1): индекс RectIndex (модуль hittest);
+- загрузка вопросов, эмоций и звуков в фоне под заставкой: функция start_loading
+  (модуль loader);
+- заблаговременная отрисовка вопроса следующей команды: метод Game.prefetch;
+- раскладка под любой размер окна (масштаб окна) и пересчет ее при изменении размера
+  окна: метод Game.relayout;
+- инициация игры; правила и состояние игры - в движке GameEngine (модуль engine),
+  класс Game только отображает его переходы;
 - организация игрового цикла;
+- отрисовка только изменившихся областей экрана: класс DirtyRender;
+- ожидание событий без опроса в режиме простоя: класс IdleScheduler;
+- перечитывание измененных файлов без перезапуска: метод Game.reload_assets;
+- профилирование кадров игры (модуль profiler): функция start_profiler;
 - завершение игры
 """
 
+import argparse
+import os
 import pygame
-from sotes import load_image, AnimatedCell, ControlCell, Board
+import assetpack
+import sotes
+from sotes import AnimatedCell, ControlCell, Board
+from hexboard import SQRT3, board_cols, player_lanes
+from hittest import RectIndex
+from watcher import FileWatcher
 from quest_screen import TextCell, QuestBoard
 from questions import QuestData
 from emotions import ImagesData
-from sounds import SoundData
+from sounds import SoundData, SOUND_END
+from engine import GameEngine, save_record
+from profiler import Profiler, HUD_KEY
+from loader import AssetLoader, Splash, load_with_splash
 
 emo = {'norm': 0, 'wrong': 2, 'smile': 3, 'quest': 1}
+# цвета дорожек игроков на поле и оттенки машинок игроков после первых двух
+lane_colors = ['#D0A0A088', '#A0A0D088', '#A0D0A088', '#D0D0A088', '#C0A0D088', '#A0D0D088']
+car_tints = ['#60FF60', '#FFFF40', '#C060FF', '#40FFFF']
+# размер окна, под который рассчитана раскладка; при другом размере все размеры
+# умножаются на масштаб окна
+BASE_SIZE = (1000, 800)
+# названия заданий фоновой загрузки на заставке
+asset_labels = {'questions': 'вопросы', 'emotions': 'эмоции', 'sounds': 'звуки'}
+# эмоция, показываемая в каждом состоянии кнопки управления (при победе не меняется)
+status_emo = {0: 'norm', 1: 'quest', 2: 'quest', 3: 'wrong', 4: 'smile'}
+
+
+def scaled(value, scale):
+    ''' размер в пикселях окна масштаба scale (раскладка рассчитана на BASE_SIZE) '''
+    return round(value * scale)
+
+
+def window_scale(size):
+    ''' масштаб, при котором раскладка помещается в окно размера size '''
+    return min(size[0] / BASE_SIZE[0], size[1] / BASE_SIZE[1])
 
 
 class InfoBoard:
-    def __init__(self, headtext, left=10, top=5, step_x=110, cell_size=160):
+    def __init__(self, headtext, left=10, top=5, step_x=110, cell_size=160, scale=1.0):
         """ создание поля, состоящего из шестиугольных сот с метками
         :param headtext: - заголовок игры
         :param left, top: отступы слева и сверху от границы основного холста
         :param step_x, cell_size: шаг по х между сотами и размер соты (диаметр соты)
+        :param scale: масштаб окна - для размеров заголовков и шрифтов
         """
         self.left = left
         self.top = top
@@ -38,229 +79,615 @@ class InfoBoard:
         face_color, res_color, move_color, once_color = '#5090BB80', '#AA50AA80', 'grey', '#50AA5080'
 
         # заголовки
-        self.head1_sprite = TextCell(self.info_sprites, left, top, w=490, h=35,
-                                     fontsize=40, color='brown', foncolor='#FFD30050')
+        self.head1_sprite = TextCell(self.info_sprites, left, top, w=scaled(490, scale),
+                                     h=scaled(35, scale), fontsize=scaled(40, scale),
+                                     color='brown', foncolor='#FFD30050')
         self.head1_sprite.add_text(headtext)
-        self.head2_sprite = TextCell(self.info_sprites, 650, top, w=150, h=35,
-                                     fontsize=40, color='brown', foncolor=move_color)
+        self.head2_sprite = TextCell(self.info_sprites, scaled(650, scale), top,
+                                     w=scaled(150, scale), h=scaled(35, scale),
+                                     fontsize=scaled(40, scale), color='brown', foncolor=move_color)
         self.head2_sprite.add_text('Чей ход')
 
         # ---- спрайты отображения состояния игры ----
         # спрайт отображения эмоций героя игры
-        info_radius, step_x, step_y = self.radius, self.step_x, 55
+        info_radius, step_x, step_y = self.radius, self.step_x, scaled(55, scale)
         x1, y1 = step_x, step_y
-        self.face_sprite = AnimatedCell(self.info_sprites, 2*info_radius, x1, y1, color=face_color)
-        tanja_image = load_image("initface.jpg", -1)
+        self.face_sprite = AnimatedCell(self.info_sprites, 2*info_radius, x1, y1, color=face_color,
+                                        fontsize=scaled(30, scale))
+        tanja_image = sotes.load_image("initface.jpg", -1)
         self.face_sprite.set_frames([tanja_image])
 
         # создание контрольного спрайта
         x1 += step_x + 3*info_radius
         y1 += info_radius
-        self.res_sprite = ControlCell(self.info_sprites, info_radius, x1, y1, res_color)
+        self.res_sprite = ControlCell(self.info_sprites, info_radius, x1, y1, res_color,
+                                      scaled(50, scale))
         contents = ['Start', 'Вопрос', '.???.', 'Ой-ёй-ёй', 'ВЕРНО!', '!ПОБЕДА!']
         self.res_sprite.set_control(contents)
 
         # создание спрайта визуализации очередности хода
         x1 += step_x + 2*info_radius
-        self.move_sprite = ControlCell(self.info_sprites, info_radius, x1, y1, move_color)
+        self.move_sprite = ControlCell(self.info_sprites, info_radius, x1, y1, move_color,
+                                       scaled(50, scale))
         contents = ['1-й игрок', '2-й игрок']
         self.move_sprite.set_control(contents)
 
 
+class DirtyRender:
+    def __init__(self, screen, groups, bgcolor=(150, 150, 150)):
+        """ отрисовка в режиме "грязных" прямоугольников: спрайты помечают себя
+        флагом dirty при изменении, и на экран выводятся только их области
+        :param screen: основной холст окна
+        :param groups: группы спрайтов в порядке отрисовки (нижние - первыми)
+        :param bgcolor: цвет фона, которым затираются изменившиеся области
+        """
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(bgcolor)
+        self.sprites = pygame.sprite.LayeredDirty()
+        for group in groups:
+            self.sprites.add(*group.sprites())
+        self.sprites.clear(screen, self.background)
+        # первый кадр выводим целиком
+        screen.blit(self.background, (0, 0))
+        self.sprites.draw(screen)
+        pygame.display.flip()
+
+    def render(self):
+        """ вывести на экран только изменившиеся области, вернуть их список """
+        rects = self.sprites.draw(self.screen)
+        if rects:
+            pygame.display.update(rects)
+        return rects
+
+    def repaint(self):
+        """ перерисовать весь экран, например, после того как окно было перекрыто """
+        self.screen.blit(self.background, (0, 0))
+        self.sprites.repaint_rect(self.screen.get_rect())
+        self.render()
+
+
+class IdleScheduler:
+    # события, после которых кадр надо сформировать заново
+    WAKE_EVENTS = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, SOUND_END,
+                   pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.VIDEORESIZE)
+
+    def __init__(self, animated):
+        """ планировщик режима простоя: вместо опроса событий с постоянной частотой
+        блокируется в pygame.event.wait до ввода, конца звука или очередного кадра анимации
+        :param animated: спрайты с анимацией (метод frame_timeout)
+        """
+        self.animated = animated
+        # движение мыши игру не меняет и будить ее не должно
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+
+    def get_timeout(self):
+        now = pygame.time.get_ticks()
+        timeouts = [sprite.frame_timeout(now) for sprite in self.animated]
+        timeouts = [t for t in timeouts if t is not None]
+        # 0 означает ждать без ограничения по времени
+        return max(min(timeouts), 1) if timeouts else 0
+
+    def wait(self):
+        """ дождаться событий; вернуть их список и признак необходимости нового кадра """
+        event = pygame.event.wait(self.get_timeout())
+        if event.type == pygame.NOEVENT:
+            # истекло время ожидания - подошел кадр анимации
+            return [], True
+        events = [event] + pygame.event.get()
+        return events, any(e.type in self.WAKE_EVENTS for e in events)
+
+
 class Game:
-    def init_players(self):
-        """ создание агентов команд игроков """
-        redcar_image = load_image("redcar.png", -1)
-        bluecar_image = load_image("bluecar.jpg", -1)
-        players_state = {0: [0, 1], 1: [0, 3]}
+    def init_players(self, nplayers=2):
+        """ создание агентов команд игроков: картинки их машинок """
+        redcar_image = sotes.load_image("redcar.png", -1)
+        bluecar_image = sotes.load_image("bluecar.jpg", -1)
         players_images = [redcar_image, bluecar_image]
-        return players_state, players_images
+        # машинки остальных игроков - перекрашенная красная
+        for n in range(2, nplayers):
+            image = redcar_image.copy()
+            image.fill(pygame.Color(car_tints[(n - 2) % len(car_tints)]),
+                       special_flags=pygame.BLEND_RGB_MULT)
+            image.set_colorkey(image.get_at((0, 0)))
+            players_images.append(image)
+        return players_images[:nplayers]
 
-    def _init_board_(self):
-        """ создание поля игры 5х5 """
-        txt_names = ['S', 'M', 'L', 'XL', 'V']
-        clr_names = ['#D0A0A088', '#D0A0A088', 'grey', '#A0A0D088', '#A0A0D088']
-        nrows, ncols = len(txt_names), 5
+    def _init_board_(self, nrows=5, area=(500, 200, 500, 600)):
+        """ создание поля игры: nrows рядов, по дорожке на каждого игрока;
+        размер сот подбирается так, чтобы поле поместилось в area (x, y, ширина, высота),
+        но не больше 100 (как на исходном поле 5х5); area и размеры - в масштабе окна 1 """
+        nplayers = len(self.players_images)
+        ncols = board_cols(nplayers)
+        txt_names = (['S', 'M', 'L', 'XL'] + [f'{n}XL' for n in range(2, nrows)])[:nrows - 1] + ['V']
+        clr_names = ['grey'] * ncols
+        for n, lane in enumerate(player_lanes(nplayers)):
+            for col in lane:
+                clr_names[col] = lane_colors[n % len(lane_colors)]
         texts = [[txt_names[row]] * ncols for row in range(nrows)]
         colors = [clr_names for _ in range(nrows)]
-        board = Board(texts, colors, left=500, top=200, cell_size=100)
+        left, top, width, height = (scaled(value, self.scale) for value in area)
+        radius = min(width / (SQRT3 * (ncols - 1) + 2), height / (2 * nrows + (ncols - 1) / 2))
+        cell_size = min(scaled(100, self.scale), 2 * int(radius))
+        board = Board(texts, colors, left=left, top=top, cell_size=cell_size,
+                      players_images=self.players_images, fontsize=scaled(50, self.scale))
         board.cell_sprites.update(None)
         return board
 
     def __init__(self, gamehead='Вспомнить ВСЕ вместе с Таней', filename='quest.csv',
-                 datapath='.\data', imagepath='.\emotions'):
+                 datapath=os.path.join('.', 'data'), imagepath=os.path.join('.', 'emotions'),
+                 prewarm=True, seed=None, nplayers=2, nrows=5, assets=None, scale=1.0):
+        ''' :param assets: уже загруженные в фоне объекты (см. функцию start_loading):
+                       {'questions': QuestData, 'emotions': ImagesData, 'sounds': SoundData};
+                       чего нет - загружается здесь же
+        :param scale: масштаб окна (см. BASE_SIZE); смена масштаба - метод relayout
+        '''
         self.headtext = gamehead
-        # создаем объект для работы с вопросами
-        self.qdata = QuestData(filename, datapath)
-        # создаем объект для работы с картинками эмоций
-        self.emotions = ImagesData(path=imagepath)
-        # создаем объект для работы со звуками
-        self.sounds = SoundData()
+        self.scale = scale
+        assets = assets or {}
+        # создаем объект для работы с вопросами; seed делает выбор вопросов повторяемым
+        if 'questions' in assets:
+            self.qdata = assets['questions']
+        else:
+            self.qdata = QuestData(filename, datapath, seed=seed)
+        # создаем объект для работы с картинками эмоций; читаются они по мере надобности
+        if 'emotions' in assets:
+            self.emotions = assets['emotions']
+        else:
+            self.emotions = ImagesData(path=imagepath)
+            self.emotions.prefetch(0)
+        # создаем объект для работы со звуками; короткие звуки сразу читаем в память
+        if 'sounds' in assets:
+            self.sounds = assets['sounds']
+        else:
+            self.sounds = SoundData(preload=True)
         # инициируем игроков
-        self.players_state, self.players_images = self.init_players()
-        self.player_n = 0
+        self.players_images = self.init_players(nplayers)
         # инициируем доски игры
-        self.board = self._init_board_()
+        self.board = self._init_board_(nrows)
+        # состояние игры: кнопка управления, очередь хода, позиции игроков
+        self.engine = GameEngine(self.qdata, self.board.nrows, nplayers, seed)
+        self.players_state = self.engine.players_state
+        # эмоции есть не для всех рядов большого поля - выше берем самые верхние
+        self.emotions_top = max((row for row, _ in self.emotions.index), default=0)
         # разместим машинки игроков на старте
-        state0 = self.players_state[0]
-        state1 = self.players_state[1]
-        self.board.cells[state0[0]][state0[1]].next_status()
-        self.board.cells[state1[0]][state1[1]].next_status()
+        for row, col in self.players_state.values():
+            self.board.cells[row][col].next_status()
         self.board.cell_sprites.update(None)
         # инициируем доску вопроса/ответов
         self.question = ['ЗДЕСЬ БУДЕТ ВОПРОС', 'Здесь будет ответ №1',
                          'Здесь будет ответ №2', 'Здесь будет ответ №3']
         self.questboard = self._init_questboard_()
-        self.choice = 0  # пока не выбрали ответ
         # инициируем доску контроля / информации
         self.infoboard = self._init_infoboard_()
-        # настраиваем поле очередности хода
-        self.infoboard.move_sprite.set_control(self.players_images)
-        # настраиваем поле результата
-        contents = ['Start', 'Вопрос', '.???.', 'Ой-ёй-ёй', 'ВЕРНО!', '!ПОБЕДА!']
-        self.infoboard.res_sprite.set_control(contents)
+        if prewarm:
+            # заранее масштабируем уже прочитанные эмоции под окошко аватара
+            self.emotions.get_image(0, emo['quest'])
+            self.infoboard.face_sprite.prewarm(self.emotions)
+        self._prefetch_emotions_()
+        # цели нажатия мыши
+        self.hits = self._init_hits_()
+        # какая эмоция сейчас показана и ждет ли файл вопросов перечитывания
+        self.face_key = None
+        self.questions_changed = False
         self.sounds.play_sound(6)
 
-    def _init_questboard_(self):
+    def _prefetch_emotions_(self):
+        ''' фоновое чтение эмоций текущих и следующих уровней игроков '''
+        for level, _ in self.players_state.values():
+            self.emotions.prefetch(level)
+            self.emotions.prefetch(level + 1)
+
+    def _init_questboard_(self, texts=None):
         ''' Создаем доску для отображения вопроса '''
-        questboard = QuestBoard(self.question, left=30, top=270, width=400, head_height=50, height=110)
+        def px(value):
+            return scaled(value, self.scale)
+        questboard = QuestBoard(texts or self.question, left=px(30), top=px(270), width=px(400),
+                                head_height=px(50), height=px(110), font_size=px(30),
+                                scale=self.scale)
         questboard.quest_sprites.update(None)
         return questboard
 
     def _init_infoboard_(self):
         ''' Создаем доску для отображения вопроса '''
-        infoboard = InfoBoard(self.headtext)
+        def px(value):
+            return scaled(value, self.scale)
+        infoboard = InfoBoard(self.headtext, left=px(10), top=px(5), step_x=px(110),
+                              cell_size=px(160), scale=self.scale)
+        # настраиваем поле очередности хода
+        infoboard.move_sprite.set_control(self.players_images)
+        # настраиваем поле результата
+        contents = ['Start', 'Вопрос', '.???.', 'Ой-ёй-ёй', 'ВЕРНО!', '!ПОБЕДА!']
+        infoboard.res_sprite.set_control(contents)
         infoboard.info_sprites.update(None)
         return infoboard
 
-    def change_state(self, mouse_pos):
+    def relayout(self, scale):
+        ''' пересчитать раскладку досок один раз под новый масштаб окна (а не растягивать
+        каждый кадр): надписи и картинки рисуются заново в своем размере, а готовые холсты
+        прежних масштабов остаются в кэшах (text_render, scaled_images, baked_cells),
+        так что возврат к прежнему размеру окна почти ничего не стоит; кэши ограничены
+        по памяти (LRU), и перетаскивание края окна не копит холсты всех промежуточных размеров
+        :return: изменилась ли раскладка
+        '''
+        if scale == self.scale:
+            return False
+        self.scale = scale
+        # запоминаем состояние досок
+        board_status = [[cell.status for cell in row] for row in self.board.cells]
+        texts = [cell.text for cell in self.questboard.cells]
+        answer_status = [cell.status for cell in self.questboard.cells]
+        res_status = self.infoboard.res_sprite.status
+        move_status = self.infoboard.move_sprite.status
+        # строим доски заново и возвращаем им состояние
+        self.board = self._init_board_(self.board.nrows)
+        for row, statuses in zip(self.board.cells, board_status):
+            for cell, status in zip(row, statuses):
+                cell.run_command(status)
+        self.questboard = self._init_questboard_(texts)
+        for cell, status in zip(self.questboard.cells, answer_status):
+            cell.status = status
+        self.questboard.quest_sprites.update(None)
+        if self.engine.next_quest is not None:
+            # заранее выбранный вопрос рисуем заново в новом размере
+            _, _, qid, perm = self.engine.next_quest
+            self.questboard.prerender(self.qdata.get_quest_texts(qid, perm))
+        self.infoboard = self._init_infoboard_()
+        self.infoboard.res_sprite.run_command(res_status)
+        self.infoboard.move_sprite.run_command(move_status)
+        if self.face_key is not None:
+            self.infoboard.face_sprite.set_frames(self.emotions.get_image(*self.face_key))
+        self.infoboard.face_sprite.prewarm(self.emotions)
+        self.hits = self._init_hits_()
+        return True
+
+    def _init_hits_(self):
+        ''' индекс целей нажатия мыши: спрайты досок вопроса и информации '''
+        hits = RectIndex()
+        sprites = self.questboard.quest_sprites.sprites() + self.infoboard.info_sprites.sprites()
+        for sprite in sprites:
+            hits.add(sprite.rect, sprite, getattr(sprite, 'check_mouse', None))
+        return hits
+
+    def click(self, mouse_pos):
+        ''' обработка нажатия мыши: цель находится по индексу, без перебора спрайтов '''
+        target = self.hits.at(mouse_pos)
+        if target in self.questboard.cells:
+            # переключаем только нажатый ответ
+            target.update(mouse_pos)
+        self.change_state(mouse_pos, target)
+
+    def change_state(self, mouse_pos, target=None):
         ''' проверка - какая кнопка была нажата и в каком состоянии находится
-        в зависимости от этого изменяем состояние спрайтов
+        нажатие переводится в действие движка игры, а его переходы - в
+        изменения спрайтов, эмоций и звуков;
         эту функцию вызываем после апдейта доски вопроса и
         вместо апдейта доски управления
+        :param target: уже найденная цель нажатия (см. click)
         '''
-        level, col = self.players_state[self.player_n]
-        # проверяем нажатие кнопки управления
-        if self.infoboard.res_sprite.check_mouse(mouse_pos):
+        if target is None:
+            target = self.hits.at(mouse_pos)
+        action = None
+        if target is self.infoboard.res_sprite:
             # была нажата кнопка управления / результата
-            ctrl_state = self.infoboard.res_sprite.status
-            if ctrl_state == 0: # 'Start'
-                # задаем вопрос для данного уровня
-                self.question = self.qdata.get_next_quest(level=level)
-                self.questboard.add_question(self.question)
-                self.questboard.quest_sprites.update(None)
-                # переводим кнопку управления и эмоций в следующее состояние
-                self.infoboard.res_sprite.run_command(1)
-                tanja_image = self.emotions.get_image(level, emo['quest'])
-                self.infoboard.face_sprite.set_frames(tanja_image)
-                # включаем музон
-                self.sounds.play_sound(1)
-            elif ctrl_state == 2: # '.???.'
-                # проверяем, что верно и меняем инфо статус соответственно
-                if self.qdata.is_it_right(self.question[0], self.question[self.choice]):
-                    tanja_image = self.emotions.get_image(level, emo['smile'])
-                    self.infoboard.face_sprite.set_frames(tanja_image)
-                    self.infoboard.res_sprite.run_command(4) # верно!
-                    # включаем соответствующий музон
-                    self.sounds.play_sound(4)
-                else:
-                    tanja_image = self.emotions.get_image(level, emo['wrong'])
-                    self.infoboard.face_sprite.set_frames(tanja_image)
-                    self.infoboard.res_sprite.run_command(3) # НЕверно!
-                    # включаем соответствующий музон
-                    self.sounds.play_sound(3)
-            elif ctrl_state in [3, 4]: # не/верно
-                # меняем состояние игрового поля и проверяем завершение игры
-                delta_row, delta_col = 0, 0
-                if ctrl_state == 3: # неверно - косой ход
-                    # оцениваем необходимое смещение по столбцу
-                    delta_col = ((1 + col - self.player_n) % 2) * 2 - 1
-                    if (delta_col + self.player_n) == 1 or (delta_col - self.player_n) == -2:
-                        delta_row = 1
-                elif ctrl_state == 4: # верно - прямой ход
-                    delta_row = 1
-                # меняем состояние двух полей
-                newlevel, newcol = level + delta_row, col + delta_col
-                self.board.cells[level][col].next_status()
-                self.board.cells[newlevel][newcol].next_status()
-                self.players_state[self.player_n] = [newlevel, newcol]
-                # очищаем доску вопроса
-                self.questboard.add_question([' ', ' ', ' ', ' '])
-                self.questboard.quest_sprites.update(None)
-                self.choice = 0
-                # проверяем условие завершение игры
-                if newlevel == self.board.nrows - 1:
-                    # Виктория!
-                    self.infoboard.res_sprite.run_command(5)
-                    # включаем соответствующий музон
-                    self.sounds.play_sound(5)
-                else:
-                    # меняем состояние кнопки хода
-                    self.player_n = (self.player_n + 1) % 2
-                    self.infoboard.move_sprite.next_status()
-                    # меняем кнопку управления
-                    self.infoboard.res_sprite.run_command(0)
-                    # меняем эмоцию
-                    tanja_image = self.emotions.get_image(newlevel, emo['norm'])
-                    self.infoboard.face_sprite.set_frames(tanja_image)
-                    # включаем соответствующий музон
-                    self.sounds.play_sound(0)
-
-        elif (self.questboard.get_answernum() > 0) and \
-                self.infoboard.res_sprite.status == 1:
+            action = self.engine.control_action()
+        elif (self.questboard.get_answernum() > 0) and self.engine.status == 1:
             # была нажата кнопка ответа в состоянии вопроса
-            self.choice = self.questboard.get_answernum()
-            # делаем переход к следующему состоянию инфо кнопок
-            tanja_image = self.emotions.get_image(level, emo['quest'])
-            self.infoboard.face_sprite.set_frames(tanja_image)
-            # меняем кнопку управления
-            self.infoboard.res_sprite.run_command(2)
-            # включаем соответствующий музон
-            self.sounds.play_sound(2)
+            action = str(self.questboard.get_answernum())
+        if action is not None:
+            self.apply(action)
+
+    def apply(self, action):
+        ''' выполнить действие движка игры и отобразить его переходы '''
+        for transition in self.engine.apply(action):
+            self.show(transition)
+        if self.questions_changed and self.engine.status not in (1, 2):
+            self._reload_questions_()
+
+    def reload_assets(self, paths):
+        ''' перечитать только измененные файлы: одну эмоцию, один звук, файл вопросов
+        :param paths: измененные файлы (см. модуль watcher)
+        '''
+        for path in paths:
+            try:
+                if os.path.samefile(os.path.dirname(path), self.sounds.path):
+                    state = self.sounds.get_state(os.path.basename(path))
+                    if state is not None:
+                        self.sounds.reload(state)
+                        print(f"Перечитан звук состояния {state}: '{path}'")
+                elif path == self.qdata.fullname:
+                    # вопрос, на который сейчас отвечают, не подменяем - ждем конца хода
+                    self.questions_changed = True
+                    if self.engine.status not in (1, 2):
+                        self._reload_questions_()
+                else:
+                    name = os.path.relpath(path, self.emotions.path).split(os.sep)[0]
+                    row_col = self.emotions.get_rowcol(name)
+                    if row_col is not None:
+                        self.emotions.reload(row_col)
+                        print(f"Перечитана эмоция {row_col}: '{path}'")
+                        if row_col == self.face_key:
+                            self.infoboard.face_sprite.set_frames(self.emotions.get_image(*row_col))
+            except (OSError, ValueError, KeyError, pygame.error) as error:
+                # файл мог быть еще не дописан - дождемся следующего изменения
+                print(f"Не удалось перечитать '{path}': {error}")
+
+    def prefetch(self):
+        ''' пока команда отвечает, заранее выбрать и отрисовать вопрос следующей команды;
+        вызывается после смены кадра, чтобы не задерживать показ текущего вопроса
+        :return: был ли подготовлен вопрос
+        '''
+        texts = self.engine.prefetch()
+        if not texts:
+            return False
+        self.questboard.prerender(texts)
+        return True
+
+    def _reload_questions_(self):
+        self.questions_changed = False
+        # заранее выбранный вопрос - из прежнего файла
+        self.engine.cancel_prefetch()
+        self.qdata.reload()
+        self.engine.top_level = max(self.qdata.qdict, default=0)
+        print(f"Перечитан файл вопросов '{self.qdata.fullname}'")
+
+    def show(self, transition):
+        ''' отобразить один переход движка игры '''
+        kind = transition['type']
+        if kind == 'question':
+            # задаем вопрос для данного уровня
+            self.question = transition['texts']
+            self.questboard.add_question(self.question)
+            self.questboard.quest_sprites.update(None)
+        elif kind == 'move':
+            # меняем состояние двух полей
+            (level, col), (newlevel, newcol) = transition['from'], transition['to']
+            self.board.cells[level][col].next_status()
+            self.board.cells[newlevel][newcol].next_status()
+            self._prefetch_emotions_()
+            # очищаем доску вопроса
+            self.questboard.add_question([' ', ' ', ' ', ' '])
+            self.questboard.quest_sprites.update(None)
+        elif kind == 'turn':
+            # меняем состояние кнопки хода
+            self.infoboard.move_sprite.next_status()
+        elif kind == 'status':
+            # меняем кнопку управления и эмоцию, включаем соответствующий музон
+            status = transition['status']
+            self.infoboard.res_sprite.run_command(status)
+            if status in status_emo:
+                level = min(transition['level'], self.emotions_top)
+                self.face_key = (level, emo[status_emo[status]])
+                tanja_image = self.emotions.get_image(*self.face_key)
+                self.infoboard.face_sprite.set_frames(tanja_image)
+            self.sounds.play_sound(status)
+
+
+def start_loading(loader, filename='quest.csv', datapath=os.path.join('.', 'data'),
+                  imagepath=os.path.join('.', 'emotions'), seed=None):
+    ''' фоновая загрузка того, что дольше всего читается при создании Game
+    (результаты передаются в Game параметром assets):
+    - банк вопросов;
+    - индекс эмоций и картинки первого уровня (convert() - в основном потоке);
+    - список звуков; сами звуки читаются в память уже во время игры
+    '''
+    def read_emotions():
+        emotions = ImagesData(path=imagepath)
+        return emotions, emotions.read_level(0)
+
+    def finish_emotions(result):
+        emotions, decoded = result
+        emotions.store_decoded(decoded)
+        # картинки из пакета и остальные эмоции уровня
+        emotions.prefetch(0)
+        return emotions
+
+    def finish_sounds(sounds):
+        loader.add('sounds_preload', sounds.preload, required=False)
+        return sounds
+
+    loader.add('questions', lambda: QuestData(filename, datapath, seed=seed))
+    loader.add('emotions', read_emotions, finish_emotions)
+    loader.add('sounds', SoundData, finish_sounds)
+
+
+def start_profiler(game, render=None, profiler=None):
+    ''' включить профилирование: подменить замерами основные методы игры
+    :param profiler: уже идущий профилировщик (после смены раскладки доски новые)
+    '''
+    if profiler is None:
+        profiler = Profiler()
+    profiler.instrument(game, 'change_state')
+    for name, group in [('questboard', game.questboard.quest_sprites),
+                        ('board', game.board.cell_sprites),
+                        ('infoboard', game.infoboard.info_sprites)]:
+        profiler.instrument(group, 'update', f'{name}.update')
+        profiler.instrument(group, 'draw', f'{name}.draw')
+    if render is not None:
+        profiler.instrument(render, 'render', 'dirty.render')
+    profiler.instrument(AnimatedCell, 'set_frames')
+    profiler.instrument(TextCell, 'draw_text')
+    profiler.instrument(SoundData, 'play_sound')
+    profiler.instrument(ImagesData, 'get_image')
+    profiler.instrument(sotes, 'load_image')
+    # сводка - в свободной полосе под доской вопросов, чтобы не закрывать ответы
+    screen = pygame.display.get_surface()
+    profiler.place_hud((scaled(10, game.scale), game.questboard.cells[-1].rect.bottom + 3),
+                       game.scale, screen.get_rect() if screen is not None else None)
+    return profiler
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Игра-квест для двух команд')
+    parser.add_argument('--dirty', action='store_true',
+                        help='перерисовывать только изменившиеся области экрана')
+    parser.add_argument('--idle', action='store_true',
+                        help='ждать событий вместо опроса с постоянной частотой кадров')
+    parser.add_argument('--pack', nargs='?', const='assets.pack', default=None,
+                        help='брать картинки из пакета, собранного assetpack.py')
+    parser.add_argument('--quest', default='quest.csv',
+                        help='файл вопросов в папке data: .csv, .xlsx или банк .qbank')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='инициализация случайного выбора вопросов (повторяемая игра)')
+    parser.add_argument('--profile', nargs='?', const='profile.json', default=None,
+                        help='профилировать кадры (сводка - клавиша F3), запись - в .json или .csv')
+    parser.add_argument('--watch', type=int, nargs='?', const=500, default=None,
+                        help='следить за файлами вопросов, эмоций и звуков и перечитывать '
+                             'измененные без перезапуска; значение - период проверки, мс')
+    parser.add_argument('--players', type=int, default=2, help='количество команд')
+    parser.add_argument('--rows', type=int, default=5, help='количество рядов поля')
+    parser.add_argument('--record', default=None,
+                        help='дописать запись игры в файл (повтор - python engine.py replay)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='масштаб окна: 2 - окно 2000x1600 с надписями и картинками '
+                             'в полном разрешении')
+    parser.add_argument('--size', default=None,
+                        help='размер окна ШxВ, например 3840x2160; раскладка подбирается под него')
+    args = parser.parse_args()
+    if args.record and args.seed is None:
+        # без seed записанную игру не повторить - выбираем его сами
+        args.seed = int.from_bytes(os.urandom(4), 'little')
+
     pygame.init()
-    size = width, height = 1000, 800
-    screen = pygame.display.set_mode(size)
+    if args.size:
+        size = tuple(int(x) for x in args.size.lower().split('x'))
+    else:
+        size = tuple(scaled(x, args.scale) for x in BASE_SIZE)
+    # размер окна можно менять: раскладка пересчитывается один раз после изменения
+    screen = pygame.display.set_mode(size, pygame.RESIZABLE)
     pygame.display.set_caption('Игра')
     fps = 10 # количество кадров в секунду
     clock = pygame.time.Clock()
+    if args.pack:
+        assetpack.open_pack(args.pack)
 
-    # создаем объект для реализации игры
     # считываем название игры, если есть
+    game_head = None
     try:
-        f = open('.\data\game_head.txt')
+        f = open(os.path.join('.', 'data', 'game_head.txt'), encoding='windows-1251')
         game_head = f.read().strip('/n').rstrip()
         f.close()
         game_head = game_head[:30]
-        game = Game(game_head)
-    except:
-        game = Game()
+    except (OSError, UnicodeError):
+        pass
+    # окно сразу показывает заставку, а вопросы, эмоции и звуки читаются в фоне
+    loader = AssetLoader()
+    start_loading(loader, filename=args.quest, seed=args.seed)
+    splash = Splash(game_head or 'Игра', labels=asset_labels, scale=window_scale(size))
+    assets = load_with_splash(screen, loader, splash)
+    if assets is None:
+        # окно закрыли во время загрузки
+        pygame.quit()
+        raise SystemExit
+    # окно могли изменить во время загрузки: масштаб берем по его нынешнему размеру
+    screen = pygame.display.get_surface()
+    # создаем объект для реализации игры
+    game = Game(*([game_head] if game_head else []), filename=args.quest, seed=args.seed,
+                nplayers=args.players, nrows=args.rows, assets=assets,
+                scale=window_scale(screen.get_size()))
+
+    bgcolor = (150, 150, 150)
+    render = None
+    if args.dirty:
+        render = DirtyRender(screen, [game.questboard.quest_sprites,
+                                      game.board.cell_sprites,
+                                      game.infoboard.info_sprites], bgcolor)
+    watcher = None
+    if args.watch:
+        watcher = FileWatcher([game.emotions.path, game.sounds.path, game.qdata.fullname],
+                              interval=args.watch, now=pygame.time.get_ticks())
+    idle = None
+    if args.idle:
+        idle = IdleScheduler([game.infoboard.face_sprite] + ([watcher] if watcher else []))
+    profiler = None
+    if args.profile:
+        profiler = start_profiler(game, render)
 
     # Запускаем основной цикл игры
     running = True
     while running:
         # обработка событий
-        for event in pygame.event.get():
+        if idle is not None:
+            events, need_frame = idle.wait()
+        else:
+            events, need_frame = pygame.event.get(), True
+        if profiler is not None:
+            profiler.begin_frame()
+        resized = False
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.MOUSEBUTTONDOWN:
-                game.questboard.quest_sprites.update(event.pos)
-                game.change_state(event.pos)
-                game.board.cell_sprites.update(None)
+                game.click(event.pos)
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED) and render is not None:
+                render.repaint()
+            if event.type == pygame.KEYDOWN and profiler is not None and event.key == HUD_KEY:
+                profiler.hud = not profiler.hud
+                if render is not None:
+                    render.repaint()
+            if event.type == pygame.VIDEORESIZE:
+                resized = True
+        if resized:
+            # за кадр раскладка пересчитывается один раз, сколько бы событий ни пришло
+            screen = pygame.display.get_surface()
+            game.relayout(window_scale(screen.get_size()))
+            if render is not None:
+                render = DirtyRender(screen, [game.questboard.quest_sprites,
+                                              game.board.cell_sprites,
+                                              game.infoboard.info_sprites], bgcolor)
+            if idle is not None:
+                idle.animated = [game.infoboard.face_sprite] + ([watcher] if watcher else [])
+            if profiler is not None:
+                # замеры переносим на новые доски
+                profiler.disable()
+                start_profiler(game, render, profiler)
+            need_frame = True
+        if not loader.done():
+            # звуки дочитываются в фоне уже во время игры
+            loader.poll()
+        if watcher is not None:
+            changed = watcher.poll(pygame.time.get_ticks())
+            if changed:
+                game.reload_assets(changed)
+                need_frame = True
+        if not need_frame:
+            if profiler is not None:
+                profiler.end_frame()
+            continue
 
     # формирование кадра
-        screen.fill((150, 150, 150))
         game.infoboard.info_sprites.update(None)
-        game.questboard.quest_sprites.draw(screen)
-        game.board.cell_sprites.draw(screen)
-        game.infoboard.info_sprites.draw(screen)
+        if render is not None:
+            # смена только изменившихся областей кадра
+            render.render()
+            if profiler is not None:
+                profiler.end_frame()
+                hud_rect = profiler.draw_hud(screen)
+                if hud_rect is not None:
+                    pygame.display.update(hud_rect)
+        else:
+            screen.fill(bgcolor)
+            game.questboard.quest_sprites.draw(screen)
+            game.board.cell_sprites.draw(screen)
+            game.infoboard.info_sprites.draw(screen)
+            if profiler is not None:
+                profiler.end_frame()
+                profiler.draw_hud(screen)
 
-        # смена кадра
-        pygame.display.flip()
+            # смена кадра
+            pygame.display.flip()
+        # пока команда думает над ответом - готовим следующий вопрос
+        game.prefetch()
         # временная задержка
-        clock.tick(fps)
+        if idle is None:
+            clock.tick(fps)
 
+    if args.record:
+        save_record(args.record, dict(game.engine.record(), quest=args.quest))
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump(args.profile)
+        print(f"Запись профиля сохранена в '{args.profile}'")
+    loader.close()
     pygame.quit()
 
@@ -0,0 +1,174 @@
+''' Модуль геометрии и правил движения по полю из шестиугольных сот (без pygame)
+Поле - nrows рядов и ncols столбцов. У каждого игрока своя дорожка из двух соседних
+столбцов: внутренний (ближе к середине поля, с него игрок стартует) и внешний;
+дорожки разделены одним свободным столбцом. Для 2 игроков это исходное поле 5х5:
+дорожки (1, 0) и (3, 4), столбец 2 свободен.
+
+Правила хода (те же, что были в Game.change_state):
+- верный ответ - ход прямо на следующий ряд;
+- неверный ответ - косой ход: с внутреннего столбца на внешний в том же ряду,
+  с внешнего - на внутренний в следующем ряду, т.е. путь в 2 раза длиннее.
+
+Основной функционал модуля:
+- дорожки игроков и ширина поля по числу игроков: функции player_lanes, board_cols;
+- таблицы переходов клеток для каждого игрока: функция move_tables, класс MoveTable;
+- центры всех сот и вершины шестиугольника, вычисленные один раз: класс HexGeometry;
+- сота под точкой (нажатием мыши) за O(1): метод HexGeometry.cell_at;
+- точная проверка попадания точки в шестиугольник: функция hex_contains;
+'''
+import math
+import numpy as np
+
+SQRT3 = math.sqrt(3)
+
+
+def board_cols(nplayers):
+    ''' ширина поля: по 2 столбца на игрока и по 1 свободному между дорожками '''
+    return 3 * nplayers - 1
+
+
+def player_lanes(nplayers):
+    ''' дорожки игроков: список (внутренний столбец, внешний столбец) '''
+    middle = (board_cols(nplayers) - 1) / 2
+    lanes = []
+    for player_n in range(nplayers):
+        left, right = 3 * player_n, 3 * player_n + 1
+        # внутренний - ближний к середине поля; у средней дорожки - правый
+        if abs(left - middle) < abs(right - middle):
+            lanes.append((left, right))
+        else:
+            lanes.append((right, left))
+    return lanes
+
+
+def start_cols(nplayers):
+    return tuple(inner for inner, _ in player_lanes(nplayers))
+
+
+def move_rule(row, col, lane, right):
+    ''' клетка, в которую игрок с дорожкой lane попадает из (row, col) после ответа '''
+    if right:  # верно - прямой ход
+        return row + 1, col
+    # неверно - косой ход
+    inner, outer = lane
+    if col == inner:
+        return row, outer
+    return row + 1, inner
+
+
+def move_tables(nrows, ncols=None, nplayers=2):
+    ''' таблицы переходов: tables[игрок, верно, клетка] -> клетка; клетка = row * ncols + col
+    из последнего ряда и из клеток вне дорожки игрок никуда не ходит '''
+    ncols = ncols or board_cols(nplayers)
+    tables = np.tile(np.arange(nrows * ncols, dtype=np.int32), (nplayers, 2, 1))
+    for player_n, lane in enumerate(player_lanes(nplayers)):
+        for right in (0, 1):
+            for row in range(nrows - 1):
+                for col in lane:
+                    new_row, new_col = move_rule(row, col, lane, right)
+                    tables[player_n, right, row * ncols + col] = new_row * ncols + new_col
+    return tables
+
+
+class MoveTable:
+    def __init__(self, nrows, nplayers=2):
+        ''' таблица переходов поля nrows рядов для nplayers игроков; ход - выборка из нее '''
+        self.nrows = nrows
+        self.nplayers = nplayers
+        self.ncols = board_cols(nplayers)
+        self.tables = move_tables(nrows, self.ncols, nplayers).tolist()
+
+    def move(self, player_n, row, col, right):
+        cell = self.tables[player_n][int(bool(right))][row * self.ncols + col]
+        return divmod(cell, self.ncols)
+
+
+class HexGeometry:
+    def __init__(self, nrows, ncols, radius, left=0, top=0):
+        ''' координаты центров всех сот поля; столбцы тем выше, чем дальше они от середины
+        :param radius: радиус соты (половина размера соты)
+        :param left, top: отступы поля слева и сверху
+        '''
+        self.nrows, self.ncols, self.radius = nrows, ncols, radius
+        self.middle_n = (ncols - 1) / 2
+        self.left = left + radius
+        self.bottom = top + radius * (2 * nrows - 1 + self.middle_n)
+        self.centers = [[(int(self.left + col * SQRT3 * radius),
+                          int(self.bottom - radius * (2 * row + abs(col - self.middle_n))))
+                         for col in range(ncols)] for row in range(nrows)]
+        self.points = hex_points(radius)
+
+    def get_pos(self, row, col):
+        return self.centers[row][col]
+
+    def cell_at(self, x, y):
+        ''' сота (row, col), в которую попадает точка (x, y), или None
+        Центры сот каждой половины поля лежат на решетке шестиугольников "плоской
+        стороной вверх" с радиусом 2r/sqrt(3) (соседи по столбцу - через 2r, по ряду - через
+        sqrt(3)r со сдвигом на r). Половины поля зеркальны, поэтому x отражаем
+        относительно среднего столбца, переводим точку в осевые координаты решетки
+        (q - столбец от середины, row - ряд) и округляем их как кубические координаты.
+        Затем из 3х3 сот вокруг найденной выбираем ближайший центр - это поправляет
+        стык половин у среднего столбца и округление центров до пикселей.
+        '''
+        r = self.radius
+        x_mid = self.left + self.middle_n * SQRT3 * r
+        # у четного числа столбцов середина - между двумя средними столбцами
+        shift = self.middle_n % 1
+        side = 1 if x >= x_mid else -1
+        q = abs(x - x_mid) / (SQRT3 * r) - shift
+        row = (self.bottom - y) / (2 * r) - (q + shift) / 2
+        q, row = cube_round(q, row)
+        col = int(round(self.middle_n + side * (q + shift)))
+
+        best, best_dist = None, None
+        for cell_row in range(max(row - 1, 0), min(row + 2, self.nrows)):
+            for cell_col in range(max(col - 1, 0), min(col + 2, self.ncols)):
+                cx, cy = self.centers[cell_row][cell_col]
+                dist = (x - cx) ** 2 + (y - cy) ** 2
+                if best is None or dist < best_dist:
+                    best, best_dist = (cell_row, cell_col), dist
+        # ближайшая сота есть всегда; точка вне поля не попадает в ее шестиугольник решетки
+        if best is None:
+            return None
+        if not hex_contains(*self.centers[best[0]][best[1]], x, y, 2 * r / SQRT3):
+            return None
+        return best
+
+    def size(self):
+        ''' ширина и высота поля '''
+        return (int(SQRT3 * self.radius * (self.ncols - 1)) + 2 * self.radius,
+                int(self.radius * (2 * self.nrows + self.middle_n)))
+
+
+def cube_round(q, r):
+    ''' округление дробных осевых координат шестиугольника до ближайшего шестиугольника '''
+    s = -q - r
+    rq, rr, rs = round(q), round(r), round(s)
+    dq, dr, ds = abs(rq - q), abs(rr - r), abs(rs - s)
+    if dq > dr and dq > ds:
+        rq = -rr - rs
+    elif dr > ds:
+        rr = -rq - rs
+    return int(rq), int(rr)
+
+
+def hex_contains(cx, cy, x, y, radius):
+    ''' лежит ли точка (x, y) в шестиугольнике "плоской стороной вверх"
+    с центром (cx, cy) и радиусом описанной окружности radius '''
+    dx, dy = abs(x - cx), abs(y - cy)
+    return dy <= SQRT3 / 2 * radius and SQRT3 * dx + dy <= SQRT3 * radius
+
+
+_hex_points = {}
+
+
+def hex_points(radius):
+    ''' вершины шестиугольника, вписанного в квадрат 2*radius (для рисования соты) '''
+    points = _hex_points.get(radius)
+    if points is None:
+        low, high = int(radius * (1 - SQRT3 / 2)), int(radius * (1 + SQRT3 / 2))
+        points = ((2 * radius, radius), (int(1.5 * radius), low), (int(0.5 * radius), low),
+                  (0, radius), (int(0.5 * radius), high), (int(1.5 * radius), high))
+        _hex_points[radius] = points
+    return points
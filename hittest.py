@@ -0,0 +1,40 @@
+''' Модуль поиска цели нажатия мыши
+Основной функционал модуля (класса RectIndex):
+- индекс прямоугольников целей (спрайтов досок вопроса и информации) по корзинам
+  равномерной сетки: нажатие проверяется только с целями своей корзины, т.е. за O(1);
+- у цели может быть точная проверка попадания (например, шестиугольник кнопки);
+- нажатие всегда попадает не более чем в одну цель - в добавленную последней;
+
+Соты игрового поля ищутся без индекса, по геометрии поля: Board.cell_at.
+'''
+
+
+class RectIndex:
+    def __init__(self, bucket=64):
+        ''' :param bucket: размер квадратной корзины сетки, пикселей '''
+        self.bucket = bucket
+        # (столбец, ряд корзины) -> список (порядковый номер, прямоугольник, цель, проверка)
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, rect, target, test=None):
+        ''' добавить цель с прямоугольником rect (x, y, ширина, высота)
+        :param test: точная проверка попадания test(pos) внутри прямоугольника
+        '''
+        x, y, w, h = rect
+        entry = (self.count, (x, y, w, h), target, test)
+        self.count += 1
+        for bx in range(x // self.bucket, (x + w - 1) // self.bucket + 1):
+            for by in range(y // self.bucket, (y + h - 1) // self.bucket + 1):
+                self.buckets.setdefault((bx, by), []).append(entry)
+
+    def at(self, pos):
+        ''' цель, в которую попадает точка pos, или None '''
+        px, py = pos
+        found = None
+        for entry in self.buckets.get((px // self.bucket, py // self.bucket), ()):
+            n, (x, y, w, h), target, test = entry
+            if x <= px < x + w and y <= py < y + h and (test is None or test(pos)):
+                if found is None or n > found[0]:
+                    found = entry
+        return found[2] if found is not None else None
@@ -0,0 +1,112 @@
+''' Модуль поэтапной загрузки игры с заставкой
+Окно открывается и сразу показывает заставку с ходом загрузки, а вопросы, картинки
+и звуки читаются одновременно в пуле потоков.
+
+Основной функционал модуля:
+- фоновое выполнение заданий загрузки: класс AssetLoader; в потоке выполняется только
+  чтение и декодирование, а convert() и все, что требует окна, - в основном потоке
+  (завершение задания, finish);
+- обязательные задания нужны для первого состояния игры, остальные (например, чтение
+  всех звуков) доделываются уже во время игры;
+- заставка с названием игры и полосой хода загрузки: класс Splash;
+- загрузка с заставкой до готовности обязательных заданий: функция load_with_splash;
+'''
+import pygame
+from concurrent.futures import ThreadPoolExecutor
+from fonts import text_render
+
+
+class AssetLoader:
+    def __init__(self, workers=3):
+        ''' :param workers: количество потоков загрузки '''
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # имя -> (Future, завершение, обязательное ли)
+        self.jobs = {}
+        # имя -> результат завершенного задания
+        self.results = {}
+        self.required = set()
+
+    def add(self, name, work, finish=None, required=True):
+        ''' начать задание: work() выполняется в потоке, finish(результат) - в основном
+        потоке при опросе (метод poll); результат задания - то, что вернул finish '''
+        self.jobs[name] = (self.executor.submit(work), finish, required)
+        if required:
+            self.required.add(name)
+
+    def poll(self):
+        ''' завершить готовые задания в основном потоке (ошибки заданий поднимаются здесь)
+        :return: готовы ли все обязательные задания
+        '''
+        for name in [name for name, (future, _, _) in self.jobs.items() if future.done()]:
+            future, finish, _ = self.jobs.pop(name)
+            result = future.result()
+            # завершение может добавить новые задания
+            self.results[name] = finish(result) if finish is not None else result
+        return not any(required for _, _, required in self.jobs.values())
+
+    def progress(self):
+        ''' доля завершенных обязательных заданий и имена тех, что еще идут '''
+        waiting = [name for name in self.jobs if name in self.required]
+        if not self.required:
+            return 1.0, waiting
+        return 1 - len(waiting) / len(self.required), waiting
+
+    def done(self):
+        return not self.jobs
+
+    def close(self):
+        ''' отменить не начатые задания и дождаться идущих (до закрытия pygame) '''
+        for future, _, _ in self.jobs.values():
+            future.cancel()
+        self.executor.shutdown(wait=True)
+
+
+class Splash:
+    def __init__(self, headtext, labels=None, bgcolor=(150, 150, 150), color='#AA50AA',
+                 bar_size=(500, 30), scale=1.0):
+        ''' заставка: название игры и полоса хода загрузки по центру окна
+        :param labels: названия заданий загрузки для показа {имя: название}
+        :param scale: масштаб окна - для размеров шрифтов и полосы
+        '''
+        self.headtext = headtext
+        self.labels = labels or {}
+        self.scale = scale
+        self.bgcolor = bgcolor
+        self.color = color
+        self.bar_size = tuple(round(x * scale) for x in bar_size)
+
+    def draw(self, screen, fraction, waiting):
+        screen.fill(self.bgcolor)
+        center_x, center_y = screen.get_rect().center
+        head = text_render.render(self.headtext, round(50 * self.scale), self.color)
+        screen.blit(head, head.get_rect(midbottom=(center_x, center_y - round(40 * self.scale))))
+        bar = pygame.Rect((0, 0), self.bar_size)
+        bar.center = (center_x, center_y)
+        pygame.draw.rect(screen, 'white', bar, 2)
+        filled = bar.inflate(-8, -8)
+        filled.width = int(filled.width * fraction)
+        pygame.draw.rect(screen, self.color, filled)
+        if waiting:
+            label = 'Загрузка: ' + ', '.join(self.labels.get(name, name) for name in waiting)
+        else:
+            label = 'Начинаем!'
+        text = text_render.render(label, round(30 * self.scale), 'white')
+        screen.blit(text, text.get_rect(midtop=(center_x, bar.bottom + round(15 * self.scale))))
+
+
+def load_with_splash(screen, loader, splash, fps=30):
+    ''' показывать заставку, пока не готовы обязательные задания загрузки
+    :return: результаты заданий или None, если окно закрыли во время загрузки
+    '''
+    clock = pygame.time.Clock()
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                loader.close()
+                return None
+        ready = loader.poll()
+        splash.draw(screen, *loader.progress())
+        pygame.display.flip()
+        if ready:
+            return loader.results
+        clock.tick(fps)
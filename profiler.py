@@ -0,0 +1,171 @@
+''' Модуль профилирования кадров игры
+Основной функционал модуля (класса Profiler):
+- замер времени выбранных методов и функций: они подменяются оберткой
+  только при включении профилирования (метод instrument), поэтому выключенный
+  профилировщик ничего не стоит - в игре остаются исходные методы;
+- запись по каждому кадру: длительность кадра, время замеренных методов,
+  счетчики отрисовки надписей, масштабирования картинок и создания шрифтов;
+- вывод сводки поверх экрана игры (HUD), включается и выключается клавишей F3;
+- сохранение записи кадров в JSON или CSV (по расширению файла);
+
+Время вложенных вызовов входит в время внешних: например, draw_text
+вызывается внутри update группы спрайтов и учитывается в обоих.
+'''
+import csv
+import functools
+import inspect
+import json
+import time
+import pygame
+from collections import deque
+from fonts import text_render
+from sotes import scaled_images
+
+HUD_KEY = pygame.K_F3
+
+
+class Profiler:
+    def __init__(self, max_frames=100000, hud_pos=(10, 723), hud_size=(460, 75), font_size=22):
+        ''' :param max_frames: сколько последних кадров хранить
+        :param hud_pos, hud_size: место сводки на экране (в масштабе 1)
+        :param font_size: размер шрифта сводки (в масштабе 1)
+        '''
+        self.frames = deque(maxlen=max_frames)
+        # имя замера -> [вызовов, всего мс, максимум мс]
+        self.totals = {}
+        # (объект, имя атрибута, исходное значение в __dict__ или None)
+        self.patched = []
+        self.current = {}
+        self.frame_start = None
+        self.counters = self.get_counters()
+        self.start_time = time.perf_counter()
+        self.frame_n = 0
+        self.hud = True
+        self.hud_size = hud_size
+        self.font_size = font_size
+        self.hud_rect = pygame.Rect(hud_pos, hud_size)
+        self.font = None
+        self.scale = 1.0
+
+    @staticmethod
+    def get_counters():
+        return {'renders': text_render.misses, 'scales': scaled_images.scales,
+                'font_creations': text_render.font_creations}
+
+    def add(self, name, ms):
+        self.current[name] = self.current.get(name, 0) + ms
+        total = self.totals.setdefault(name, [0, 0, 0])
+        total[0] += 1
+        total[1] += ms
+        total[2] = max(total[2], ms)
+
+    def instrument(self, target, attr, name=None):
+        ''' подменить target.attr (метод класса, объекта или функцию модуля) замером времени
+        :param name: имя замера; по умолчанию - имя атрибута
+        '''
+        name = name or attr
+        own = vars(target).get(attr)
+        original = getattr(target, attr)
+        add = self.add
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                add(name, (time.perf_counter() - start) * 1000)
+
+        if isinstance(inspect.getattr_static(target, attr), staticmethod):
+            timed = staticmethod(timed)
+        setattr(target, attr, timed)
+        self.patched.append((target, attr, own))
+
+    def disable(self):
+        ''' вернуть исходные методы '''
+        while self.patched:
+            target, attr, own = self.patched.pop()
+            if own is None:
+                delattr(target, attr)
+            else:
+                setattr(target, attr, own)
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.current = {}
+        self.counters = self.get_counters()
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        end = time.perf_counter()
+        counters = self.get_counters()
+        self.frames.append({'frame': self.frame_n,
+                            'time': round(end - self.start_time, 4),
+                            'frame_ms': round((end - self.frame_start) * 1000, 3),
+                            'sections': {k: round(v, 3) for k, v in self.current.items()},
+                            'counters': {k: counters[k] - self.counters[k] for k in counters}})
+        self.frame_n += 1
+        self.frame_start = None
+
+    def hud_lines(self, last=60):
+        frames = list(self.frames)[-last:]
+        frame = frames[-1]
+        times = [f['frame_ms'] for f in frames]
+        lines = [f"кадр {frame['frame']}: {frame['frame_ms']:.1f} мс, "
+                 f"за {len(times)} кадров: среднее {sum(times) / len(times):.1f}, "
+                 f"макс {max(times):.1f}"]
+        top = sorted(frame['sections'].items(), key=lambda x: -x[1])[:3]
+        lines.append(', '.join(f'{k} {v:.1f}' for k, v in top) or 'замеров в кадре нет')
+        lines.append(', '.join(f'{k} {v}' for k, v in frame['counters'].items()))
+        totals = self.get_counters()
+        lines.append('всего: ' + ', '.join(f'{k} {v}' for k, v in totals.items()))
+        return lines
+
+    def place_hud(self, topleft, scale=1.0, bounds=None):
+        ''' поставить сводку в topleft и пересчитать ее размер и шрифт под масштаб окна
+        :param bounds: прямоугольник экрана, за который сводка не должна выходить
+        '''
+        if scale != self.scale:
+            self.scale = scale
+            self.font = None
+        self.hud_rect = pygame.Rect(topleft, [round(x * scale) for x in self.hud_size])
+        if bounds is not None:
+            self.hud_rect.clamp_ip(bounds)
+
+    def draw_hud(self, screen):
+        ''' нарисовать сводку на screen; вернуть ее прямоугольник или None '''
+        if not self.hud or not self.frames:
+            return None
+        if self.font is None:
+            # свой шрифт: надписи сводки не должны попадать в счетчики text_render
+            self.font = pygame.font.Font(None, max(round(self.font_size * self.scale), 8))
+        screen.fill((30, 30, 30), self.hud_rect)
+        x, y = self.hud_rect.left + 5, self.hud_rect.top + 5
+        for line in self.hud_lines():
+            screen.blit(self.font.render(line, True, (200, 255, 200)), (x, y))
+            y += self.font.get_linesize()
+        return self.hud_rect
+
+    def summary(self):
+        ''' итог по замерам: {имя: {calls, total_ms, mean_ms, max_ms}} '''
+        return {name: {'calls': calls, 'total_ms': round(total, 3),
+                       'mean_ms': round(total / calls, 4), 'max_ms': round(peak, 3)}
+                for name, (calls, total, peak) in sorted(self.totals.items())}
+
+    def dump(self, filename):
+        ''' сохранить запись кадров: *.csv - строка на кадр, иначе JSON со сводкой '''
+        if filename.endswith('.csv'):
+            names = sorted({k for f in self.frames for k in f['sections']})
+            counters = list(self.get_counters())
+            with open(filename, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame', 'time', 'frame_ms'] + names + counters)
+                for frame in self.frames:
+                    writer.writerow([frame['frame'], frame['time'], frame['frame_ms']]
+                                    + [frame['sections'].get(k, 0) for k in names]
+                                    + [frame['counters'][k] for k in counters])
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump({'summary': self.summary(), 'counters': self.get_counters(),
+                           'frames': list(self.frames)}, f, ensure_ascii=False, indent=1)
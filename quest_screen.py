@@ -1,14 +1,73 @@
 ''' Модуль отрисовки поля вопросов
 Основной функционал модуля:
+- раскладка текста по строкам с кэшированием результата: класс TextLayout;
 - реализация функционала поля отрисовки текста вопросов/ответов: класс TextCell;
 - реализация функционала доски вопросов/ответов: класс QuestBoard;
+- заблаговременная отрисовка следующего вопроса на запасных холстах: метод QuestBoard.prerender;
 '''
 
 import pygame
 import numpy as np
+from collections import OrderedDict
+from fonts import text_render
+
+
+class TextLayout:
+    ''' Раскладка текста по строкам заданной ширины
+    - ширины слов измеряются через Font.size, перенос строк делается за один проход;
+    - готовые раскладки хранятся в ограниченном кэше (LRU);
+    - шрифты и отрисованные строки берутся из общего сервиса text_render
+    '''
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self.layouts = OrderedDict()
+
+    def wrap(self, text, width, fontsize):
+        ''' разбить текст на строки, умещающиеся в ширину width
+        :return: кортеж строк
+        '''
+        key = (text, width, fontsize)
+        lines = self.layouts.get(key)
+        if lines is not None:
+            self.layouts.move_to_end(key)
+            return lines
+        words = text.split()
+        if not words:
+            lines = ('        ',)
+        else:
+            font = text_render.get_font(fontsize)
+            space = font.size(' ')[0]
+            lines = []
+            line, line_width = [words[0]], font.size(words[0])[0]
+            for word in words[1:]:
+                word_width = font.size(word)[0]
+                if line_width + space + word_width <= width:
+                    line.append(word)
+                    line_width += space + word_width
+                else:
+                    # слово шире строки все равно занимает отдельную строку
+                    lines.append(' '.join(line))
+                    line, line_width = [word], word_width
+            lines.append(' '.join(line))
+            lines = tuple(lines)
+        self.layouts[key] = lines
+        if len(self.layouts) > self.max_items:
+            self.layouts.popitem(last=False)
+        return lines
+
+    def render(self, text, width, fontsize, color):
+        ''' получить отрисованные строки текста заданным цветом
+        :return: список холстов (surface) строк
+        '''
+        return [text_render.render(line, fontsize, color)
+                for line in self.wrap(text, width, fontsize)]
+
+
+# общая раскладка текста для всех текстовых ячеек
+text_layout = TextLayout()
 
 
-class TextCell(pygame.sprite.Sprite):
+class TextCell(pygame.sprite.DirtySprite):
     def __init__(self, text_sprites, x, y, w, h, fontsize=30, color='white', foncolor='black'):
         super().__init__(text_sprites)
         self.left, self.top = x, y
@@ -20,41 +79,56 @@ class TextCell(pygame.sprite.Sprite):
         self.rect = pygame.Rect(x, y, w, h)
         self.image = pygame.Surface((w, h), pygame.SRCALPHA, 32)
         self.text = ''
+        # что сейчас нарисовано на холсте: (текст, статус, отступы)
+        self.drawn = None
+        # запасной холст с заранее нарисованным текстом и что на нем нарисовано
+        self.spare = None
+        self.spare_drawn = None
         self.image.fill(pygame.Color(foncolor))
         self.draw_text()
 
-    def draw_text(self, dX=5, dY=1):
-        font = pygame.font.Font(None, self.fontsize)
-        # формируем список строк, умещающихся в заданную ширину
-        if not self.text:
-            lines = ['        ']
-        else:
-            words = self.text.split()
-            lines = []
-            while words:
-                word_n = 0
-                line = ' '.join(words[:word_n + 1])
-                while font.render(line, True, pygame.Color('white')).get_width() <= self.width:
-                    word_n += 1
-                    if word_n == len(words): break
-                    line = ' '.join(words[:word_n + 1])
-                lines.append(' '.join(words[:word_n]))
-                words = words[word_n:]
+    def paint(self, surface, text, status, dX, dY):
+        # строки, умещающиеся в заданную ширину, берем из кэша раскладки
+        lines = text_layout.render(text, self.width, self.fontsize, self.colors[status])
 
         # построчно выводим текст, начиная с использованием отступов dX, dY
         text_x, text_y = dX, dY
-        foncolor_n = (self.status + 1) % 2
-        self.image.fill(self.colors[foncolor_n])
+        foncolor_n = (status + 1) % 2
+        surface.fill(self.colors[foncolor_n])
         for line in lines:
-            text = font.render(line, True, self.colors[self.status])
-            self.image.blit(text, (text_x, text_y))
-            text_y += text.get_height() + dY
+            surface.blit(line, (text_x, text_y))
+            text_y += line.get_height() + dY
+
+    def draw_text(self, dX=5, dY=1):
+        # ничего не изменилось - холст уже готов
+        state = (self.text, self.status, dX, dY)
+        if state == self.drawn:
+            return
+        self.paint(self.image, self.text, self.status, dX, dY)
+        self.drawn = state
+        self.dirty = 1
+
+    def prerender(self, text, dX=5, dY=1):
+        ''' заранее нарисовать text на запасном холсте; когда этот текст добавят
+        (add_text), холсты просто поменяются местами '''
+        state = (text, 0, dX, dY)
+        if state == self.spare_drawn:
+            return
+        if self.spare is None:
+            self.spare = pygame.Surface((self.width, self.height), pygame.SRCALPHA, 32)
+        self.paint(self.spare, text, 0, dX, dY)
+        self.spare_drawn = state
 
     def add_text(self, text):
         ''' масштабировать и добавить картинку в середину соты
         :param text: текст в виде строки
         '''
         self.text = text
+        if self.spare_drawn is not None and self.spare_drawn[:2] == (text, self.status):
+            # текст нарисован заранее - меняем холсты, прежний станет запасным
+            self.image, self.spare = self.spare, self.image
+            self.drawn, self.spare_drawn = self.spare_drawn, None
+            self.dirty = 1
 
     def next_status(self):
         self.status = (self.status + 1) % 2
@@ -67,12 +141,13 @@ class TextCell(pygame.sprite.Sprite):
 
 class QuestBoard:
     def __init__(self, texts, left=20, top=20, width=400,
-                 head_height = 100, height=100, font_size=30):
+                 head_height = 100, height=100, font_size=30, scale=1.0):
         ''' создание поля бокса вопроса(заголовка) и боксов с ответами с контролем выбора
         :param texts: - список вопроса и ответов; вопрос - в начале
         :param left, top: отступы слева и сверху от границы основного холста
         :param width, head_height, height: ширина и высота бокса вопроса и ответов
         :param font_size: размер шрифта в вопросах и ответах
+        :param scale: масштаб окна - для интервалов между боксами
         '''
         self.texts = texts
         # цвет шрифта вопроса, шрифта ответов и фона
@@ -84,7 +159,8 @@ class QuestBoard:
         self.height = height
         self.font_size = font_size
         # параметры по умолчанию - отступы и интервалы между ответами
-        self.dx, self.dy = 10, 20
+        self.dx, self.dy = round(10 * scale), round(20 * scale)
+        self.gap = round(10 * scale)
 
         # создадим группу, содержащую все спрайты квеста
         self.quest_sprites = pygame.sprite.Group()
@@ -98,6 +174,12 @@ class QuestBoard:
                        for row in range(1, len(texts))]
         self.add_question(texts)
 
+    def prerender(self, texts):
+        ''' заранее нарисовать следующий вопрос и ответы; его показ (add_question)
+        будет только сменой холстов ячеек '''
+        for cell, text in zip(self.cells, texts):
+            cell.prerender(text)
+
     # разместить вопрос и ответы в ячейках поля
     def add_question(self, texts):
         for row, cell in enumerate(self.cells):
@@ -111,7 +193,7 @@ class QuestBoard:
         pos_y = self.top
         if row:
             pos_x += self.dx
-            pos_y += self.head_height + 10 + self.dy
+            pos_y += self.head_height + self.gap + self.dy
             if row > 1:
                 pos_y += (row -1) * (self.dy + self.height)
         return pos_x, pos_y
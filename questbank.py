@@ -0,0 +1,113 @@
+''' Модуль скомпилированного (двоичного) банка вопросов
+Компиляция файла вопросов (csv или Excel) в банк:
+
+    python questbank.py compile data/quest.csv data/quest.qbank
+
+Основной функционал модуля:
+- упаковка таблицы вопросов QuestTable в двоичный колоночный формат: функция pack_bank;
+- открытие банка через mmap без чтения его целиком: класс QuestBank;
+  строки вопроса декодируются только при обращении к нему, поэтому время
+  запуска и занимаемая память не зависят от размера банка;
+
+Формат (все числа little-endian, каждая секция выровнена на 8 байт):
+- заголовок: сигнатура, версия, количество ответов, количество вопросов, уровней;
+- таблица уровней: (уровень, начало, длина) в массиве номеров вопросов;
+- номера вопросов (uint32), сгруппированные по уровням, внутри уровня - по возрастанию;
+- уровни вопросов (int16) и номера верных ответов (int8);
+- смещения строк (uint64): на каждый вопрос сам вопрос и его ответы, плюс конец;
+- тексты строк в UTF-8 подряд.
+'''
+import mmap
+import struct
+import sys
+import numpy as np
+
+MAGIC = b'QBNK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+LEVEL_DTYPE = np.dtype([('level', '<i4'), ('start', '<u4'), ('length', '<u4')])
+
+
+def _aligned(size):
+    return size + (-size % 8)
+
+
+def pack_bank(table):
+    ''' упаковать таблицу вопросов (levels, right, answers_n, get_row) в байты банка '''
+    count, answers_n = len(table), table.answers_n
+    levels = np.asarray(table.levels, dtype='<i2')
+    right = np.asarray(table.right, dtype='i1')
+    groups = sorted(table.level_ids().items())
+    level_table = np.array([(level, 0, len(ids)) for level, ids in groups], dtype=LEVEL_DTYPE)
+    if len(groups):
+        level_table['start'][1:] = np.cumsum(level_table['length'])[:-1]
+    ids = np.concatenate([ids for _, ids in groups]).astype('<u4') if groups \
+        else np.zeros(0, dtype='<u4')
+    strings = [text.encode('utf-8') for qid in range(count)
+               for text in table.get_row(qid)[:answers_n + 1]]
+    offsets = np.zeros(len(strings) + 1, dtype='<u8')
+    np.cumsum([len(text) for text in strings], out=offsets[1:])
+
+    sections = [HEADER.pack(MAGIC, VERSION, answers_n, count, len(level_table)),
+                level_table.tobytes(), ids.tobytes(), levels.tobytes(), right.tobytes(),
+                offsets.tobytes()]
+    data = b''.join(section + b'\0' * (-len(section) % 8) for section in sections)
+    return data + b''.join(strings)
+
+
+def write_bank(table, out):
+    with open(out, 'wb') as f:
+        f.write(pack_bank(table))
+
+
+class QuestBank:
+    def __init__(self, source):
+        ''' банк вопросов с тем же интерфейсом, что и QuestTable
+        :param source: имя файла банка (открывается через mmap) или байты банка
+        '''
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buffer = source
+        magic, version, self.answers_n, count, nlevels = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Данные не являются банком вопросов версии {VERSION}')
+        # массивы - это представления поверх буфера, без копирования
+        pos = _aligned(HEADER.size)
+        self.level_table = np.frombuffer(self.buffer, LEVEL_DTYPE, nlevels, pos)
+        pos += _aligned(self.level_table.nbytes)
+        self.ids = np.frombuffer(self.buffer, '<u4', count, pos)
+        pos += _aligned(self.ids.nbytes)
+        self.levels = np.frombuffer(self.buffer, '<i2', count, pos)
+        pos += _aligned(self.levels.nbytes)
+        self.right = np.frombuffer(self.buffer, 'i1', count, pos)
+        pos += _aligned(self.right.nbytes)
+        self.offsets = np.frombuffer(self.buffer, '<u8', count * (self.answers_n + 1) + 1, pos)
+        self.text_start = pos + _aligned(self.offsets.nbytes)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def get_row(self, qid):
+        ''' [вопрос, ответ1, ...] - декодируется только эта строка банка '''
+        k = self.answers_n + 1
+        bounds = self.offsets[qid * k: qid * k + k + 1].tolist()
+        start = self.text_start
+        return [str(self.buffer[start + a: start + b], 'utf-8')
+                for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def level_ids(self):
+        ''' номера вопросов каждого уровня: {уровень: массив номеров} '''
+        return {int(level): self.ids[start: start + length]
+                for level, start, length in self.level_table.tolist()}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'compile':
+        print('использование: python questbank.py compile <файл вопросов .csv/.xlsx> <банк .qbank>')
+        sys.exit(1)
+    from questions import read_table
+    table = read_table(sys.argv[2])
+    write_bank(table, sys.argv[3])
+    print(f"Скомпилирован банк '{sys.argv[3]}': {len(table)} вопросов")
@@ -1,78 +1,385 @@
 ''' Модуль загрузки и интерфейса работы с вопросами / ответами
 Основной функционал модуля (класса QuestData):
-- загрузка вопросов и ответов из файла quest.csv в таблицу quests = pd.DataFrame;
-- подготовка пула еще не отвеченных вопросов;
-- случайный выбор вопроса из пула по заданному уровню сложности level;
-- формирование списка вопрос, ответы в случайном порядке;
-- проверка правильный ли выбран ответ на данный вопрос;
+- загрузка вопросов и ответов из файла quest.csv в таблицу QuestTable модулем csv;
+  pandas подключается только для чтения файлов Excel (.xlsx, .xls);
+- открытие скомпилированного банка вопросов .qbank через mmap (модуль questbank);
+- хранение прочитанных из csv/Excel вопросов в компактном виде банка вопросов
+  (один буфер UTF-8 и массивы numpy): функция compact_table; отчет о памяти: memory_usage;
+- подготовка пулов еще не отвеченных вопросов по уровням: класс QuestPool;
+- случайный выбор вопроса из пула по заданному уровню сложности level
+  (генератор случайных чисел можно инициализировать seed для повторяемости игры);
+- пополнение пула уровня, когда его вопросы закончились;
+- возврат в пул выбранного заранее, но так и не заданного вопроса (put_back);
+- выдача номера вопроса и перестановки его ответов в случайном порядке;
+- формирование списка вопрос, ответы в порядке перестановки;
+- проверка правильный ли выбран ответ на данный вопрос: по номеру вопроса и ответа
+  (поиск в массиве номеров верных ответов) или по тексту вопроса и ответа;
+
+Номер вопроса - это номер строки в файле (без заголовка), ответы нумеруются с 0
+в том порядке, в котором они записаны в файле.
 '''
-import pandas as pd
+import copy
+import csv
+import mmap
 import numpy as np
 import os, sys
+from questbank import QuestBank, pack_bank
+
+
+class QuestTable:
+    def __init__(self, levels, rows, answers_n):
+        ''' таблица вопросов
+        :param levels: уровни сложности вопросов
+        :param rows: строки вида [вопрос, ответ1, ответ2, ...]
+        :param answers_n: количество ответов на вопрос
+        '''
+        self.levels = np.array(levels, dtype=np.int16)
+        self.rows = rows
+        self.answers_n = answers_n
+        # номер верного ответа для каждого вопроса - в файле верный ответ всегда 1-й
+        self.right = np.zeros(len(rows), dtype=np.int8)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_row(self, qid):
+        return self.rows[qid]
+
+    def level_ids(self):
+        ''' номера вопросов каждого уровня: {уровень: массив номеров} '''
+        order = np.argsort(self.levels, kind='stable')
+        levels, starts = np.unique(self.levels[order], return_index=True)
+        return {int(level): ids for level, ids in zip(levels, np.split(order, starts[1:]))}
+
+
+def make_table(header, records):
+    ''' собрать таблицу из заголовка и записей файла; нужны колонки level,
+    question и answer* (ответы - в порядке следования колонок) '''
+    header = [str(name).strip() for name in header]
+    level_col = header.index('level')
+    cols = [header.index('question')] + [n for n, name in enumerate(header) if 'answer' in name]
+    levels, rows = [], []
+    for record in records:
+        if not record:
+            continue
+        levels.append(int(record[level_col]))
+        rows.append([record[n] if n < len(record) else '' for n in cols])
+    return QuestTable(levels, rows, len(cols) - 1)
+
+
+def read_csv_table(fullname):
+    with open(fullname, encoding='windows-1251', newline='') as f:
+        reader = csv.reader(f, delimiter=';')
+        return make_table(next(reader), reader)
+
+
+def read_excel_table(fullname):
+    # pandas нужен только здесь, а его импорт заметно удлиняет запуск игры
+    import pandas as pd
+    data = pd.read_excel(fullname, dtype=str, keep_default_na=False)
+    return make_table(data.columns, data.itertuples(index=False))
+
+
+def read_table(fullname):
+    ''' прочитать вопросы из файла: Excel, скомпилированный банк или csv '''
+    ext = os.path.splitext(fullname)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        return read_excel_table(fullname)
+    if ext == '.qbank':
+        return QuestBank(fullname)
+    return read_csv_table(fullname)
+
+
+def compact_table(table):
+    ''' уложить прочитанную таблицу в память в формате банка вопросов (модуль questbank):
+    все тексты - один буфер UTF-8 с массивом смещений, уровни и верные ответы - массивы
+    int16/int8, номера вопросов уровней - массив uint32; вместо списка строк Python
+    на каждый вопрос. Банк, открытый из файла, остается как есть (он уже в mmap) '''
+    if isinstance(table, QuestBank):
+        return table
+    return QuestBank(pack_bank(table))
+
+
+def table_memory(table):
+    ''' память под таблицу вопросов, байт (для строк Python - вместе с самими строками) '''
+    if isinstance(table, QuestBank):
+        # банк из файла лежит в mmap и читается системой по мере надобности
+        return 0 if isinstance(table.buffer, mmap.mmap) else len(table.buffer)
+    return (table.levels.nbytes + table.right.nbytes + sys.getsizeof(table.rows)
+            + sum(sys.getsizeof(row) + sum(sys.getsizeof(text) for text in row)
+                  for row in table.rows))
+
+
+class QuestPool:
+    def __init__(self, ids, rng, asked=()):
+        ''' пул неотвеченных вопросов одного уровня
+        номера вопросов мысленно лежат в одном массиве: [0, size) - еще не заданные,
+        [size, ...) - уже заданные; выбор вопроса - обмен случайного номера
+        с последним не заданным, т.е. O(1). Сам массив ids не меняется (он может
+        лежать в банке, открытом только для чтения) - переставленные позиции
+        хранятся в словаре moved, поэтому память растет только с числом заданных вопросов
+        :param ids: номера вопросов уровня по возрастанию
+        :param rng: генератор случайных чисел numpy.random.Generator
+        :param asked: номера уже заданных вопросов (например, после перечитывания файла)
+        '''
+        self.ids = ids
+        self.moved = {}
+        self.size = len(self.ids)
+        self.rng = rng
+        if len(asked):
+            # заданные сразу переставляем в конец: их позиции из [0, size)
+            # меняем на позиции не заданных из [size, ...)
+            positions = set(np.searchsorted(self.ids, sorted(asked)).tolist())
+            self.size -= len(positions)
+            front = [pos for pos in positions if pos < self.size]
+            back = [pos for pos in range(self.size, len(self.ids)) if pos not in positions]
+            for pos1, pos2 in zip(front, back):
+                self.swap(pos1, pos2)
+
+    def get(self, pos):
+        ''' номер вопроса на позиции pos с учетом перестановок '''
+        qid = self.moved.get(pos)
+        return int(self.ids[pos]) if qid is None else qid
+
+    def swap(self, pos1, pos2):
+        self.moved[pos1], self.moved[pos2] = self.get(pos2), self.get(pos1)
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f'QuestPool({self.size}/{len(self.ids)})'
+
+    def asked(self):
+        ''' номера уже заданных вопросов '''
+        return [self.get(pos) for pos in range(self.size, len(self.ids))]
+
+    def draw(self):
+        ''' вынуть случайный номер вопроса или None, если пул пуст '''
+        if not self.size:
+            return None
+        last = self.size - 1
+        self.swap(int(self.rng.integers(self.size)), last)
+        self.size = last
+        return self.get(last)
+
+    def put_back(self, qid):
+        ''' вернуть в пул вынутый, но так и не заданный вопрос (выбранный заранее);
+        обычно это последний вынутый, и он лежит сразу за не заданными - O(1) '''
+        for pos in range(self.size, len(self.ids)):
+            if self.get(pos) == qid:
+                self.swap(pos, self.size)
+                self.size += 1
+                return
+
+    def refill(self):
+        ''' вернуть в пул все вопросы уровня, кроме только что заданного '''
+        recent = self.get(0) if len(self.ids) and not self.size else None
+        self.moved = {}
+        self.size = len(self.ids)
+        if recent is not None and self.size > 1:
+            # последний заданный вопрос отправляем в конец - в заданные
+            last = self.size - 1
+            self.swap(int(np.searchsorted(self.ids, recent)), last)
+            self.size = last
 
 
 class QuestData:
-    def __init__(self, filename='quest.csv', path='.\data'):
+    # что делать, когда вопросы уровня закончились:
+    # 'reshuffle' - вернуть в пул все вопросы уровня, 'none' - больше вопросов не давать
+    REFILL_POLICIES = ('reshuffle', 'none')
+
+    def __init__(self, filename='quest.csv', path=os.path.join('.', 'data'),
+                 seed=None, refill='reshuffle', verbose=True, compact=True):
+        ''' :param seed: инициализация генератора случайных чисел игры (None - случайная)
+        :param refill: политика пополнения пула уровня, см. REFILL_POLICIES
+        :param verbose: печатать номер выбранного вопроса
+        :param compact: хранить вопросы в компактном виде (см. функцию compact_table)
+        '''
+        if refill not in self.REFILL_POLICIES:
+            raise ValueError(f'Неизвестная политика пополнения вопросов: {refill}')
+        self.refill = refill
+        self.verbose = verbose
+        self.rng = np.random.default_rng(seed)
         fullname = os.path.join(path, filename)
         # если файл не существует, то выходим
         if not os.path.isfile(fullname):
-            self.data = None
+            self.table = None
             print(f"Файл с данными '{fullname}' не найден")
             sys.exit()
-        elif filename[filename.find('.'):] == 'xlsx' \
-                or filename[filename.find('.'):] == 'xls':
-            self.data = pd.read_excel(fullname)
-        else:
-            self.data = pd.read_csv(fullname, sep=';', header=0, encoding='windows-1251')
-        # self.answers_n = self.data.shape[1] - 2
-        self.answers_n = sum(['answer' in name for name in self.data.columns])
+        self.fullname = fullname
+        self.compact = compact
+        self.table = self.read()
+        self.answers_n = self.table.answers_n
+        self.init_index()
         self.init_to_play()
-        # np.random.seed()
+
+    def read(self):
+        table = read_table(self.fullname)
+        return compact_table(table) if self.compact else table
+
+    def init_index(self):
+        # номер верного ответа для каждого вопроса
+        self.right = self.table.right
+        # хэши текстов вопросов по возрастанию и номера вопросов в том же порядке;
+        # строится при первой проверке ответа по тексту, чтобы не читать весь банк
+        self.qindex = None
+
+    def find_quest(self, text):
+        ''' номера вопросов с текстом text: поиск по массиву хэшей текстов (16 байт
+        на вопрос вместо словаря всех текстов) и сверка найденных с самим текстом '''
+        if self.qindex is None:
+            hashes = np.fromiter((hash(self.table.get_row(qid)[0])
+                                  for qid in range(len(self.table))),
+                                 dtype=np.int64, count=len(self.table))
+            order = np.argsort(hashes, kind='stable')
+            self.qindex = (hashes[order], order)
+        hashes, order = self.qindex
+        key = hash(text)
+        start, end = np.searchsorted(hashes, key, 'left'), np.searchsorted(hashes, key, 'right')
+        return [qid for qid in order[start:end].tolist() if self.table.get_row(qid)[0] == text]
+
+    def memory_usage(self):
+        ''' отчет о занимаемой памяти, байт: таблица вопросов, пулы неотвеченных
+        вопросов (массивы номеров и переставленные позиции), индекс текстов, всего '''
+        pools = 0
+        for pool in self.qdict.values():
+            # номера уровней банка - представления поверх его буфера, они уже в table
+            if not isinstance(self.table, QuestBank):
+                pools += pool.ids.nbytes
+            pools += sys.getsizeof(pool.moved) + sys.getsizeof(0) * 2 * len(pool.moved)
+        qindex = sum(array.nbytes for array in self.qindex) if self.qindex is not None else 0
+        report = {'table': table_memory(self.table), 'pools': pools, 'qindex': qindex}
+        report['total'] = sum(report.values())
+        return report
 
     def init_to_play(self):
-        if len(self.data) > 1:
-            # наполняем словарь номеров неотвеченных вопросов для каждого уровня
-            self.qdict = dict()
-            for nom in self.data.index:
-                level = self.data.loc[nom, 'level']
-                if level in self.qdict:
-                    self.qdict[level].append(nom)
-                else:
-                    self.qdict[level] = [nom]
+        # наполняем словарь пулов неотвеченных вопросов для каждого уровня
+        groups = self.table.level_ids()
+        self.qdict = {level: QuestPool(ids, self.rng) for level, ids in groups.items()}
+
+    def reset(self, seed=None):
+        ''' начать выбор вопросов заново, не перечитывая файл (для повтора записанных игр) '''
+        self.rng = np.random.default_rng(seed)
+        self.init_to_play()
+
+    def reload(self):
+        ''' перечитать файл вопросов после его изменения, не начиная игру заново:
+        вопросы, которые уже были заданы (совпадает текст вопроса и уровень),
+        остаются заданными; новые и измененные вопросы попадают в пулы неотвеченных '''
+        asked = {level: {self.table.get_row(qid)[0] for qid in pool.asked()}
+                 for level, pool in self.qdict.items()}
+        self.table = self.read()
+        self.answers_n = self.table.answers_n
+        self.init_index()
+        self.qdict = {}
+        for level, ids in self.table.level_ids().items():
+            texts = asked.get(level)
+            asked_ids = [qid for qid in ids.tolist() if self.table.get_row(qid)[0] in texts] \
+                if texts else []
+            self.qdict[level] = QuestPool(ids, self.rng, asked_ids)
+
+    def fork(self, seed=None):
+        ''' новый объект с тем же банком вопросов (он общий и только читается),
+        но со своим генератором и своими пулами неотвеченных вопросов - для
+        нескольких игр в одном процессе '''
+        other = copy.copy(self)
+        other.reset(seed)
+        return other
 
     def choice_quest_num(self, level):
-        quest_nums = self.qdict[level]
-        if quest_nums:
-            qnum = np.random.choice(quest_nums, 1)[0]
-            quest_nums.remove(qnum)
-            return qnum
+        pool = self.qdict.get(level)
+        if pool is None:
+            return None
+        if not pool and self.refill == 'reshuffle':
+            pool.refill()
+        return pool.draw()
 
     def get_next_quest(self, level):
-        qlist = []
+        ''' выбрать вопрос уровня level
+        :return: номер вопроса и перестановка номеров ответов (порядок показа);
+                 (None, None), если вопросов этого уровня не осталось
+        '''
         qnum = self.choice_quest_num(level)
-        print(f'выбран вопрос {qnum}')
-        if qnum is not None:
-            qlist = list(self.data.loc[qnum, :])[1:]
+        if self.verbose:
+            print(f'выбран вопрос {qnum}')
+        if qnum is None:
+            return None, None
         # случайный порядок ответов
-        noms = list(range(1, len(qlist)))
-        noms = list(np.random.permutation(noms))
-        noms = [0] + noms
-        return list(np.array(qlist)[noms])
+        return qnum, self.rng.permutation(self.answers_n)
+
+    def put_back(self, level, qid):
+        ''' вернуть не заданный вопрос qid в пул уровня level '''
+        pool = self.qdict.get(level)
+        if pool is not None:
+            pool.put_back(qid)
+
+    def get_quest_texts(self, qid, perm):
+        ''' список: вопрос, затем ответы в порядке перестановки perm '''
+        if qid is None:
+            return []
+        row = self.table.get_row(qid)
+        return [row[0]] + [row[1 + n] for n in perm]
 
     def is_it_right(self, q, a):
-        nom = self.data.index[self.data.question == q][0]
-        return a == self.data.loc[nom, 'answer1']
+        ''' верен ли ответ
+        :param q, a: номер вопроса и номер ответа в порядке файла
+                     или текст вопроса и текст ответа
+        '''
+        if isinstance(q, (int, np.integer)):
+            return bool(self.right[q] == a)
+        return any(a == self.table.get_row(qid)[1 + self.right[qid]]
+                   for qid in self.find_quest(q))
+
+
+def measure_startup(fullname, repeat=5):
+    ''' время запуска (импорт модулей + чтение файла вопросов) в отдельном процессе:
+    чтение модулем csv против чтения через pandas; берется лучшее из repeat запусков
+    :return: словарь {способ: секунды}
+    '''
+    import subprocess, time
+    scripts = {'csv': f"import questions; questions.read_csv_table({fullname!r})",
+               'pandas': f"import pandas as pd; pd.read_csv({fullname!r}, sep=';', "
+                         f"header=0, encoding='windows-1251')"}
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, script in scripts.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], check=True, cwd=here)
+            times.append(time.perf_counter() - start)
+        results[name] = min(times)
+    return results
 
 
 if __name__ == '__main__':
+    if '--timing' in sys.argv:
+        # python questions.py --timing [файл вопросов]
+        args = [x for x in sys.argv[1:] if x != '--timing']
+        fullname = os.path.abspath(args[0] if args else os.path.join('data', 'quest.csv'))
+        for name, seconds in measure_startup(fullname).items():
+            print(f'{name}: {seconds:.3f} с')
+        sys.exit()
+    if '--memory' in sys.argv:
+        # python questions.py --memory [файл вопросов]: память в обычном и компактном виде
+        args = [x for x in sys.argv[1:] if x != '--memory']
+        fullname = os.path.abspath(args[0] if args else os.path.join('data', 'quest.csv'))
+        for compact in (False, True):
+            qdata = QuestData(os.path.basename(fullname), os.path.dirname(fullname),
+                              verbose=False, compact=compact)
+            print('компактно' if compact else 'строки Python', qdata.memory_usage())
+        sys.exit()
     qdata = QuestData()
     if qdata:
         # print(qdata.data.head())
         # print(qdata.qdict)
         # print(qdata.answers_n)
-        qlist = qdata.get_next_quest(level=0)
+        qid, perm = qdata.get_next_quest(level=0)
+        qlist = qdata.get_quest_texts(qid, perm)
         print(qlist)
         print(qdata.qdict)
+        print([qdata.is_it_right(qid, n) for n in perm])
         print(qdata.is_it_right(qlist[0], qlist[1]))
         print(qdata.is_it_right(qlist[0], qlist[2]))
         print(qdata.is_it_right(qlist[0], qlist[3]))
\ No newline at end of file
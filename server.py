@@ -0,0 +1,232 @@
+''' Модуль сервера игр: много независимых игр в одном процессе (без pygame)
+Запуск сервера и нагрузочного клиента:
+
+    python server.py serve [--host 127.0.0.1] [--port 8765] [--quest quest.csv]
+    python server.py load [--clients 100] [--games 1000] [--procs 2]
+
+Протокол: TCP, по одному запросу JSON в строке, на каждый запрос - ответ JSON в строке.
+- {"cmd": "new", "seed": 1} - новая игра; ответ {"session": id, "state": {...}};
+- {"cmd": "act", "session": id, "action": "S"} - действие движка игры (см. модуль engine);
+  ответ {"transitions": [...], "state": {...}};
+- {"cmd": "state", "session": id} - состояние игры;
+- {"cmd": "close", "session": id} - закончить игру;
+- {"cmd": "stats"} - количество игр и запросов сервера;
+при ошибке ответ {"error": "текст"}.
+
+Основной функционал модуля:
+- игры в одном цикле asyncio, каждая со своим движком GameEngine: класс GameServer;
+  банк вопросов читается один раз и общий для всех игр (только для чтения),
+  у каждой игры свои пулы неотвеченных вопросов (QuestData.fork);
+- игры закрываются вместе с соединением, в котором они были созданы;
+  действия в игре могут присылать и другие соединения (например, вторая команда);
+- нагрузочный клиент: много одновременных соединений, каждое играет случайными
+  действиями; отчет - игр и запросов в секунду, задержка запроса: функция run_load;
+  сам клиент тоже занимает ядро, поэтому его можно запустить в нескольких процессах (--procs);
+
+Сервер занимает одно ядро; на нескольких ядрах запускают несколько процессов
+с ключом --reuse-port (Linux), и система распределяет соединения между ними.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from engine import GameEngine
+from questions import QuestData
+
+
+def state_of(engine):
+    return {'status': engine.status, 'player': engine.player_n,
+            'positions': [engine.players_state[n] for n in sorted(engine.players_state)],
+            'winner': engine.winner()}
+
+
+def dumps(message):
+    # номера вопросов приходят как целые numpy
+    return (json.dumps(message, ensure_ascii=False, default=int) + '\n').encode('utf-8')
+
+
+class GameServer:
+    def __init__(self, qdata, nrows=5, nplayers=2, max_sessions=100000):
+        ''' :param qdata: объект QuestData с общим банком вопросов
+        :param nrows, nplayers: количество рядов поля и игроков
+        :param max_sessions: предельное количество одновременных игр
+        '''
+        self.qdata = qdata
+        self.nrows = nrows
+        self.nplayers = nplayers
+        self.max_sessions = max_sessions
+        # номер игры -> движок игры
+        self.sessions = {}
+        self.next_id = 0
+        self.requests = 0
+        self.connections = 0
+
+    def new_session(self, seed=None):
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError('Достигнуто предельное количество игр')
+        session = self.next_id
+        self.next_id += 1
+        self.sessions[session] = GameEngine(self.qdata.fork(seed), self.nrows,
+                                                self.nplayers, seed)
+        return session
+
+    def get_session(self, request):
+        engine = self.sessions.get(request.get('session'))
+        if engine is None:
+            raise ValueError(f"Нет игры {request.get('session')}")
+        return engine
+
+    def handle(self, request, owned=None):
+        ''' выполнить запрос; вернуть ответ
+        :param owned: множество игр соединения - они закрываются вместе с ним
+        '''
+        self.requests += 1
+        cmd = request.get('cmd')
+        if cmd == 'act':
+            engine = self.get_session(request)
+            transitions = engine.apply(str(request.get('action', '')))
+            return {'transitions': transitions, 'state': state_of(engine)}
+        if cmd == 'new':
+            session = self.new_session(request.get('seed'))
+            if owned is not None:
+                owned.add(session)
+            return {'session': session, 'state': state_of(self.sessions[session])}
+        if cmd == 'state':
+            return {'state': state_of(self.get_session(request))}
+        if cmd == 'close':
+            engine = self.get_session(request)
+            del self.sessions[request['session']]
+            if owned is not None:
+                owned.discard(request['session'])
+            return {'closed': request['session'], 'record': engine.record()}
+        if cmd == 'stats':
+            return {'sessions': len(self.sessions), 'requests': self.requests,
+                    'connections': self.connections}
+        raise ValueError(f'Неизвестная команда {cmd!r}')
+
+    async def serve_client(self, reader, writer):
+        owned = set()
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = self.handle(json.loads(line), owned)
+                except (ValueError, KeyError, TypeError, AttributeError) as error:
+                    response = {'error': str(error)}
+                writer.write(dumps(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            for session in owned:
+                self.sessions.pop(session, None)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, reuse_port=False):
+        server = await asyncio.start_server(self.serve_client, host, port,
+                                            reuse_port=reuse_port or None, limit=1 << 20)
+        print(f'Сервер игр слушает {host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+
+async def play_games(host, port, games, latencies, seed):
+    ''' одно соединение: сыграть games игр случайными действиями '''
+    rnd = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+
+    async def request(message):
+        start = time.perf_counter()
+        writer.write(dumps(message))
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    for n in range(games):
+        session = (await request({'cmd': 'new', 'seed': rnd.randrange(1 << 32)}))['session']
+        status = 0
+        while status != 5:
+            action = {0: 'S', 1: rnd.choice('123'), 2: 'C'}.get(status, 'A')
+            status = (await request({'cmd': 'act', 'session': session,
+                                     'action': action}))['state']['status']
+        await request({'cmd': 'close', 'session': session})
+    writer.close()
+    await writer.wait_closed()
+
+
+def split(total, parts):
+    return [total // parts + (n < total % parts) for n in range(parts)]
+
+
+async def load_latencies(host, port, clients, games, seed):
+    latencies = []
+    await asyncio.gather(*[play_games(host, port, count, latencies, seed + n)
+                           for n, count in enumerate(split(games, clients)) if count])
+    return latencies
+
+
+def _load_process(args):
+    return asyncio.run(load_latencies(*args))
+
+
+def run_load(host='127.0.0.1', port=8765, clients=100, games=1000, seed=0, procs=1):
+    ''' нагрузочный клиент: clients одновременных соединений играют всего games игр
+    :param procs: количество процессов клиента (соединения делятся между ними)
+    :return: отчет - игры и запросы в секунду, задержка запроса в мс
+    '''
+    jobs = [(host, port, c, g, seed + n * clients)
+            for n, (c, g) in enumerate(zip(split(clients, procs), split(games, procs)))]
+    start = time.perf_counter()
+    if procs == 1:
+        latencies = _load_process(jobs[0])
+    else:
+        with ProcessPoolExecutor(max_workers=procs) as executor:
+            latencies = [x for part in executor.map(_load_process, jobs) for x in part]
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def quantile(q):
+        return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000, 3)
+    return {'clients': clients, 'procs': procs, 'games': games, 'seconds': round(elapsed, 3),
+            'games_per_s': round(games / elapsed, 1),
+            'requests_per_s': round(len(latencies) / elapsed, 1),
+            'latency_ms': {'p50': quantile(0.5), 'p95': quantile(0.95), 'p99': quantile(0.99),
+                           'max': quantile(1)}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сервер игр и нагрузочный клиент')
+    parser.add_argument('command', choices=['serve', 'load'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--quest', default='quest.csv',
+                        help='файл вопросов в папке data: .csv, .xlsx или банк .qbank')
+    parser.add_argument('--rows', type=int, default=5, help='количество рядов поля')
+    parser.add_argument('--players', type=int, default=2, help='количество игроков')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='разрешить нескольким процессам сервера слушать один порт')
+    parser.add_argument('--clients', type=int, default=100, help='одновременных соединений')
+    parser.add_argument('--games', type=int, default=1000, help='всего игр')
+    parser.add_argument('--procs', type=int, default=1, help='процессов нагрузочного клиента')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        qdata = QuestData(args.quest, os.path.join('.', 'data'), verbose=False)
+        try:
+            server = GameServer(qdata, args.rows, args.players)
+            asyncio.run(server.serve(args.host, args.port, args.reuse_port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        report = run_load(args.host, args.port, args.clients, args.games, args.seed, args.procs)
+        print(json.dumps(report, ensure_ascii=False, indent=1))
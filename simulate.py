@@ -0,0 +1,117 @@
+''' Модуль моделирования игры методом Монте-Карло (без pygame)
+Правила движения те же, что в Game.change_state:
+- верный ответ - ход прямо на следующий ряд;
+- неверный ответ - косой (зигзагообразный) ход, путь становится в 2 раза длиннее;
+- игроки (2 и больше) ходят по очереди, первым ходит 1-й игрок; уровень вопроса равен ряду игрока;
+- побеждает тот, кто первым дошел до последнего ряда (V).
+
+Основной функционал модуля:
+- таблицы переходов клеток поля для каждого игрока берутся из модуля hexboard;
+- моделирование пачки игр сразу на массивах numpy: функция simulate_batch;
+- моделирование миллионов игр пачками, в том числе в нескольких процессах: функция simulate;
+- отчет: доли побед, преимущество первого хода, распределение длины игры;
+
+Пример:
+
+    python simulate.py --probs 0.9 0.8 0.6 0.5 --games 1000000 --workers 4
+'''
+import argparse
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from hexboard import board_cols, move_tables, start_cols
+
+def simulate_batch(probs, nrows, games, seed=None, nplayers=2):
+    ''' смоделировать games игр одновременно
+    :param probs: вероятности верного ответа по уровням, форма (уровни,) или (игроки, уровни)
+    :param nrows: количество рядов поля (уровней вопросов - на один меньше)
+    :param nplayers: количество игроков
+    :return: номера победителей и длины игр (в ходах) - массивы длины games
+    '''
+    rng = np.random.default_rng(seed)
+    ncols = board_cols(nplayers)
+    probs = np.broadcast_to(np.asarray(probs, dtype=np.float64), (nplayers, nrows - 1))
+    # вероятность верного ответа для каждой клетки поля; в последнем ряду не отвечают
+    cell_probs = np.zeros((nplayers, nrows * ncols))
+    cell_probs[:, :(nrows - 1) * ncols] = np.repeat(probs, ncols, axis=1)
+    tables = move_tables(nrows, ncols, nplayers)
+
+    pos = np.tile(np.array(start_cols(nplayers), dtype=np.int32), (games, 1))
+    winner = np.full(games, -1, dtype=np.int8)
+    length = np.zeros(games, dtype=np.int32)
+    active = np.arange(games)
+    finish = (nrows - 1) * ncols
+    turn = 0
+    while active.size:
+        player_n = turn % nplayers
+        cells = pos[active, player_n]
+        right = (rng.random(active.size) < cell_probs[player_n, cells]).astype(np.int32)
+        cells = tables[player_n, right, cells]
+        pos[active, player_n] = cells
+        turn += 1
+        won = cells >= finish
+        if won.any():
+            winner[active[won]] = player_n
+            length[active[won]] = turn
+            active = active[~won]
+    return winner, length
+
+
+def _run_batch(args):
+    probs, nrows, games, seed, nplayers = args
+    winner, length = simulate_batch(probs, nrows, games, seed, nplayers)
+    return np.bincount(winner, minlength=nplayers), np.bincount(length)
+
+
+def simulate(probs, nrows=5, games=1_000_000, batch=200_000, workers=1, seed=None, nplayers=2):
+    ''' смоделировать games игр пачками по batch
+    :param workers: количество процессов; None - по числу ядер
+    :return: отчет - словарь с долями побед, преимуществом первого хода и длинами игр
+    '''
+    sizes = [batch] * (games // batch) + ([games % batch] if games % batch else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(probs, nrows, size, s, nplayers) for size, s in zip(sizes, seeds)]
+    if workers == 1:
+        results = list(map(_run_batch, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            results = list(executor.map(_run_batch, jobs))
+
+    wins = sum(r[0] for r in results)
+    hist_len = max(len(r[1]) for r in results)
+    lengths = sum(np.pad(r[1], (0, hist_len - len(r[1]))) for r in results)
+    win_rates = wins / games
+    turns = np.arange(hist_len)
+    mean = (turns * lengths).sum() / games
+    quantiles = {q: int(np.searchsorted(np.cumsum(lengths), q * games)) for q in (0.1, 0.5, 0.9)}
+    return {'games': games,
+            'win_rates': win_rates.tolist(),
+            'first_mover_advantage': float(win_rates[0] - win_rates[1]),
+            'length_mean': float(mean),
+            'length_quantiles': quantiles,
+            'length_hist': {int(n): int(c) for n, c in enumerate(lengths) if c}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Моделирование игры методом Монте-Карло')
+    parser.add_argument('--probs', type=float, nargs='+', default=[0.8, 0.7, 0.6, 0.5],
+                        help='вероятности верного ответа по уровням')
+    parser.add_argument('--rows', type=int, default=5, help='количество рядов поля')
+    parser.add_argument('--players', type=int, default=2, help='количество игроков')
+    parser.add_argument('--games', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, default=1, help='процессов; 0 - по числу ядер')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if len(args.probs) == 1:
+        args.probs = args.probs * (args.rows - 1)
+    if len(args.probs) != args.rows - 1:
+        parser.error(f'нужно {args.rows - 1} вероятностей - по одной на уровень')
+
+    report = simulate(args.probs, args.rows, args.games, args.batch,
+                      args.workers or None, args.seed, args.players)
+    print(f"игр: {report['games']}")
+    print('доли побед игроков:', ', '.join(f'{w:.4f}' for w in report['win_rates']))
+    print(f"преимущество первого хода: {report['first_mover_advantage']:+.4f}")
+    print(f"длина игры (ходов): в среднем {report['length_mean']:.2f}, "
+          f"квантили 10/50/90%: {list(report['length_quantiles'].values())}")
@@ -1,24 +1,33 @@
 ''' Модуль отрисовки игрового поля
 Основной функционал модуля:
 - загрузка картинки из файла для последующей вставки в спрайты;
+- общий кэш масштабированных картинок: класс ScaledImages;
 - реализация функционала кнопки отрисовки картинок: класс AnimatedCell;
 - реализация функционала кнопки управления: класс ControlCell;
 - создание и инициализация игровой доски: класс Board;
 '''
 
 import pygame
-import numpy as np
 import os, sys
+from collections import OrderedDict
+from fonts import text_render
+import assetpack
+from hexboard import HexGeometry, SQRT3, hex_contains, hex_points, player_lanes
 
 
 # Изображение не получится загрузить
 # без предварительной инициализации pygame
-def load_image(name, colorkey=None, path='.\images'):
+def load_image(name, colorkey=None, path=os.path.join('.', 'images')):
     fullname = os.path.join(path, name)
     # если файл не существует, то выходим
     if not os.path.isfile(fullname):
         print(f"Файл с изображением '{fullname}' не найден")
         sys.exit()
+    # картинка из подключенного пакета уже готова и масштабирована
+    pack = assetpack.active_pack
+    key = assetpack.pack_key('images', name)
+    if pack is not None and colorkey == -1 and pack.is_fresh(key, fullname):
+        return scaled_images.add_packed(pack, key)
     image = pygame.image.load(fullname)
     if colorkey is not None:
         image = image.convert()
@@ -30,18 +39,93 @@ def load_image(name, colorkey=None, path='.\images'):
     return image
 
 
-class AnimatedCell(pygame.sprite.Sprite):
+class ScaledImages:
+    def __init__(self, max_items=512, max_bytes=32 * 1024 * 1024):
+        ''' кэш масштабированных картинок, общий для всех спрайтов
+        ключ - (id исходной картинки, размер); исходная картинка хранится вместе
+        с результатом, чтобы ее id не мог достаться другой картинке
+        :param max_items: предельное количество хранимых картинок (LRU)
+        :param max_bytes: предельный объем памяти под масштабированные картинки
+        '''
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.used_bytes = 0
+        self.scales = 0
+
+    def scale(self, image, size):
+        key = (id(image), size)
+        cached = self.images.get(key)
+        if cached is not None:
+            self.images.move_to_end(key)
+            return cached[1]
+        scaled = pygame.transform.scale(image, size)
+        self.scales += 1
+        self.put(image, size, scaled)
+        return scaled
+
+    def put(self, image, size, scaled):
+        ''' положить в кэш уже масштабированную картинку '''
+        key = (id(image), size)
+        old = self.images.pop(key, None)
+        if old is not None:
+            self.used_bytes -= old[1].get_pitch() * old[1].get_height()
+        self.images[key] = (image, scaled)
+        self.used_bytes += scaled.get_pitch() * scaled.get_height()
+        # вытесняем самые старые картинки, но последнюю оставляем всегда
+        while (len(self.images) > self.max_items or self.used_bytes > self.max_bytes) \
+                and len(self.images) > 1:
+            _, (_, old) = self.images.popitem(last=False)
+            self.used_bytes -= old.get_pitch() * old.get_height()
+
+    def forget(self, image):
+        ''' убрать все масштабированные варианты картинки image (ее вытеснили или
+        перечитали), чтобы кэш не держал ни их, ни саму картинку '''
+        for key in [key for key, (source, _) in self.images.items() if source is image]:
+            _, scaled = self.images.pop(key)
+            self.used_bytes -= scaled.get_pitch() * scaled.get_height()
+
+    def clear(self):
+        self.images.clear()
+        self.used_bytes = 0
+
+    def add_packed(self, pack, key):
+        ''' взять картинку key из пакета вместе с ее заранее масштабированными вариантами '''
+        image = pack.get(key)
+        for size in pack.get_sizes(key):
+            self.put(image, size, pack.get(key, size))
+        return image
+
+    def prewarm(self, images_data, size):
+        ''' заранее масштабировать уже прочитанные картинки эмоций
+        :param images_data: объект ImagesData
+        :param size: размер, под который масштабировать
+        '''
+        for frames in images_data.loaded():
+            for image in frames:
+                self.scale(image, size)
+
+
+# общий для всей игры кэш масштабированных картинок
+scaled_images = ScaledImages()
+
+
+class AnimatedCell(pygame.sprite.DirtySprite):
     """ квадратная ячейка размером cell_size x cell_size выводит в рамку
     список картинок, т.е. перебирает картинки в порядке их следования
     """
-    def __init__(self, cell_sprites, cell_size, x, y, color='white'):
+    def __init__(self, cell_sprites, cell_size, x, y, color='white', frame_time=100, fontsize=30):
         """ инициация размера окошка и его левого угла
         :param cell_sprites: контейнер спрайтов
         :param cell_size: размер окна вывода
         :param x, y: - координаты левого угла окна
         :param color: цвет рамки и начального текста, для красоты
+        :param frame_time: время показа одного кадра анимации, мс
+        :param fontsize: размер шрифта начального текста
         """
         super().__init__(cell_sprites)
+        self.frame_time = frame_time
+        self.fontsize = fontsize
         self.radius = cell_size // 2
         self.x, self.y = x, y
         self.color = pygame.Color(color)
@@ -50,9 +134,7 @@ class AnimatedCell(pygame.sprite.Sprite):
 
     def draw_text(self, txt):
         # сгенерируем текст txt в картинку
-        font = pygame.font.Font(None, 30)
-        text = font.render(txt, True, self.color)
-        return text
+        return text_render.render(txt, self.fontsize, self.color)
 
     def set_frames(self, images_list):
         ''' масштабировать и добавить картинку в середину соты
@@ -60,79 +142,139 @@ class AnimatedCell(pygame.sprite.Sprite):
         '''
         if images_list is None:
             return
-        self.frames = []
-        for image in images_list:
-            self.frames.append(pygame.transform.scale(image, (2 * self.radius - 2,
-                                                              2 * self.radius - 2)))
+        self.frames = [scaled_images.scale(image, self.frame_size())
+                       for image in images_list]
         self.cur_frame = 0 # указатель текущей картинки
         self.image = self.frames[self.cur_frame]
+        self.next_frame_at = pygame.time.get_ticks() + self.frame_time
+        self.dirty = 1
+
+    def frame_size(self):
+        return 2 * self.radius - 2, 2 * self.radius - 2
+
+    def prewarm(self, images_data):
+        ''' заранее подготовить кадры всех эмоций под размер окошка '''
+        scaled_images.prewarm(images_data, self.frame_size())
+
+    def frame_timeout(self, now):
+        ''' сколько мс осталось до смены кадра; None - если анимации нет '''
+        if len(self.frames) < 2:
+            return None
+        return max(self.next_frame_at - now, 0)
 
     def update(self, mouth_pos):
         if mouth_pos:
             pass
-        self.cur_frame = (self.cur_frame + 1) % len(self.frames)
-        self.image = self.frames[self.cur_frame]
+        # единственную картинку перерисовывать незачем,
+        # а кадры анимации меняем только когда подошло их время
+        now = pygame.time.get_ticks()
+        if len(self.frames) > 1 and now >= self.next_frame_at:
+            self.cur_frame = (self.cur_frame + 1) % len(self.frames)
+            self.image = self.frames[self.cur_frame]
+            self.next_frame_at = now + self.frame_time
+            self.dirty = 1
 
 
-class ControlCell(pygame.sprite.Sprite):
-    def __init__(self, control_sprites, radius, x, y, color='white'):
+class BakedCells:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        ''' готовые холсты кнопок, общие для всех ControlCell:
+        (радиус, цвет, размер шрифта, содержимое) -> (содержимое, холст); содержимое держим,
+        чтобы id картинки не мог достаться другой картинке; холсты каждого масштаба
+        окна (радиуса сот) хранятся отдельно, а давно не использованные вытесняются (LRU)
+        :param max_bytes: предельный объем памяти под холсты кнопок
+        '''
+        self.max_bytes = max_bytes
+        self.cells = OrderedDict()
+        self.used_bytes = 0
+
+    def get(self, key):
+        cached = self.cells.get(key)
+        if cached is None:
+            return None
+        self.cells.move_to_end(key)
+        return cached[1]
+
+    def put(self, key, content, image):
+        self.cells[key] = (content, image)
+        self.used_bytes += image.get_pitch() * image.get_height()
+        # вытесняем самые старые холсты, но последний оставляем всегда
+        while self.used_bytes > self.max_bytes and len(self.cells) > 1:
+            _, (_, old) = self.cells.popitem(last=False)
+            self.used_bytes -= old.get_pitch() * old.get_height()
+
+    def __len__(self):
+        return len(self.cells)
+
+    def clear(self):
+        self.cells.clear()
+        self.used_bytes = 0
+
+
+# общий для всей игры кэш готовых холстов кнопок
+baked_cells = BakedCells()
+
+
+class ControlCell(pygame.sprite.DirtySprite):
+    def __init__(self, control_sprites, radius, x, y, color='white', fontsize=50):
         super().__init__(control_sprites)
         self.radius = radius
+        # размер шрифта надписей: надпись рисуется в масштабе окна, а не растягивается
+        self.fontsize = fontsize
         self.center = x, y
         self.color = color
-        self.points = ((2 * radius, radius),
-                       (int(1.5 * radius), int(radius * (1 - np.sqrt(3) / 2))),
-                       (int(0.5 * radius), int(radius * (1 - np.sqrt(3) / 2))),
-                       (0, radius),
-                       (int(0.5 * radius), int(radius * (1 + np.sqrt(3) / 2))),
-                       (int(1.5 * radius), int(radius * (1 + np.sqrt(3) / 2)))
-                       )
+        self.points = hex_points(radius)
+        # размер надписей и картинок внутри соты
+        self.inner = int(SQRT3 * radius)
         self.rect = pygame.Rect(x - radius, y - radius, 2 * radius, 2 * radius)
-        self.image = pygame.Surface((2 * radius, 2 * radius),
-                                    pygame.SRCALPHA, 32)
-        self.contents = ['Start']
-        self.status = 0
-        self.update_content()
-        self.draw()
+        self.set_control(['Start'])
 
     def set_control(self, contents):
         ''' Программа инициации контроля над кнопкой; она устанавливает два параметра
         :param contents: список содержания (текст или картинка) в зависимости от статуса
+        Для каждого статуса сразу готовится законченный холст кнопки,
+        так что смена статуса - это только смена self.image
         '''
         self.contents = contents
         self.status = 0
+        self.images = [self.bake(content) for content in contents]
         self.update_content()
-        self.draw()
 
     def add_text(self, text=None):
         yandex_color = pygame.Color("#ffcc00")
-        font = pygame.font.Font(None, 50)
         if text is None:
-            rendered_text = font.render(' ', True, yandex_color)
-        else:
-            rendered_text = font.render(text, True, yandex_color)
+            text = ' '
+        rendered_text = text_render.render(text, self.fontsize, yandex_color)
         # вставим текст посредине
-        self.content = pygame.transform.scale(rendered_text,
-                                              (int(np.sqrt(3) * self.radius),
-                                               self.radius))
+        return pygame.transform.scale(rendered_text, (self.inner, self.radius))
 
     def add_image(self, image):
-        ''' масштабировать и добавить картинку в середину соты
+        ''' масштабировать картинку для вставки в середину соты
         :param image: картинка в виде surface (холста)
         '''
         if image is None:
-            self.added_image = None
-            return
-        self.content = pygame.transform.scale(image,
-                                              (int(np.sqrt(3) * self.radius),
-                                               int(np.sqrt(3) * self.radius)))
+            return None
+        return scaled_images.scale(image, (self.inner, self.inner))
 
-    def update_content(self):
-        content = self.contents[self.status]
+    def bake(self, content):
+        ''' получить готовый холст кнопки с содержимым content (текст или картинка) '''
+        content_key = content if isinstance(content, str) else id(content)
+        key = (self.radius, str(self.color), self.fontsize, content_key)
+        image = baked_cells.get(key)
+        if image is not None:
+            return image
+        image = pygame.Surface((2 * self.radius, 2 * self.radius),
+                               pygame.SRCALPHA, 32)
+        self.draw(image)
         if isinstance(content, str):
-            self.add_text(content)
+            self.draw_content(image, self.add_text(content))
         else:
-            self.add_image(content)
+            self.draw_content(image, self.add_image(content))
+        baked_cells.put(key, content, image)
+        return image
+
+    def update_content(self):
+        self.image = self.images[self.status]
+        self.dirty = 1
 
     def run_command(self, status):
         # status - это новый статус
@@ -140,65 +282,63 @@ class ControlCell(pygame.sprite.Sprite):
             return
         self.status = status
         self.update_content()
-        self.draw()
 
-    def draw_content(self):
-        if self.content:
-            pic_x = self.radius - self.content.get_width() // 2
-            pic_y = self.radius - self.content.get_height() // 2
-            self.image.blit(self.content, (pic_x, pic_y))
+    def draw_content(self, image, content):
+        if content:
+            pic_x = self.radius - content.get_width() // 2
+            pic_y = self.radius - content.get_height() // 2
+            image.blit(content, (pic_x, pic_y))
 
-    def draw(self):
-        pygame.draw.circle(self.image, pygame.Color(self.color),
+    def draw(self, image):
+        pygame.draw.circle(image, pygame.Color(self.color),
                            (self.radius, self.radius), self.radius)
-        pygame.draw.circle(self.image, pygame.Color("white"),
+        pygame.draw.circle(image, pygame.Color("white"),
                            (self.radius, self.radius), self.radius, 1)
-        pygame.draw.lines(self.image, pygame.Color('brown'), True, self.points, 3)
-        self.draw_content()
+        pygame.draw.lines(image, pygame.Color('brown'), True, self.points, 3)
 
     def next_status(self):
         self.status = (self.status + 1) % len(self.contents)
         self.update_content()
 
     def check_mouse(self, mouse_pos):
-        x, y = self.center
-        if (mouse_pos[0] - x) ** 2 + (mouse_pos[1] - y) ** 2 <= self.radius ** 2:
-            return True
-        else:
-            return False
+        # попадание в сам шестиугольник соты, а не в описанный круг
+        return hex_contains(*self.center, *mouse_pos, self.radius)
 
     def update(self, mouse_pos):
         if mouse_pos is not None and self.check_mouse(mouse_pos):
             self.next_status()
-        self.draw()
 
 class Board:
-    def __init__(self, textmat, colormat, left=20, top=20, cell_size=50):
+    def __init__(self, textmat, colormat, left=20, top=20, cell_size=50, players_images=None,
+                 fontsize=50):
         ''' создание поля, состоящего из шестиугольных сот с метками
         :param textmat, colormat: - матрицы названий и цветов сот по горизонтали и вертикали
         :param left, top: отступы слева и сверху от границы основного холста
         :param cell_size: размер соты (диаметр соты)
+        :param fontsize: размер шрифта меток сот
+        :param players_images: картинки игроков; дорожки игроков - см. hexboard.player_lanes,
+                               по умолчанию - красная и синяя машинки двух игроков
         '''
-        self.redcar_image = load_image("redcar.png", -1)
-        self.bluecar_image = load_image("bluecar.jpg", -1)
-        self.texts = np.array(textmat)
-        self.colors = np.array(colormat)
+        if players_images is None:
+            players_images = [load_image("redcar.png", -1), load_image("bluecar.jpg", -1)]
+        self.texts = textmat
+        self.colors = colormat
         self.ncols = len(textmat[0])
         self.nrows = len(textmat)
         self.radius = cell_size // 2
-        # значения по умолчанию
-        self.middle_n = (self.ncols - 1) / 2
-        self.left = left + self.radius
-        self.bottom = top + self.radius * (2 * self.nrows - 1 + self.middle_n)
+        # центры всех сот считаются один раз
+        self.geometry = HexGeometry(self.nrows, self.ncols, self.radius, left, top)
 
         # создадим группу, содержащую все спрайты ячейки
         self.cell_sprites = pygame.sprite.Group()
         self.cells = [[ControlCell(self.cell_sprites, self.radius,
-                            *self.get_pos(row, col), self.colors[row, col])
+                                   *self.get_pos(row, col), self.colors[row][col], fontsize)
                        for col in range(self.ncols)] for row in range(self.nrows)]
-        images_row = [self.redcar_image, self.redcar_image, 'grey',
-                      self.bluecar_image, self.bluecar_image]
-        images = np.array([images_row for _ in range(self.nrows)])
+        # картинка столбца - игрока, чья это дорожка; свободные столбцы - 'grey'
+        images_row = ['grey'] * self.ncols
+        for image, lane in zip(players_images, player_lanes(len(players_images))):
+            for col in lane:
+                images_row[col] = image
         '''
         commands = {'init': {'from': -1, 'to': 0},
                     'go_in': {'from': 0, 'to': 1},
@@ -206,15 +346,20 @@ class Board:
                     '''
         for row in range(self.nrows):
             for col in range(self.ncols):
-                contents = [self.texts[row, col], images[row, col], 'passed']
+                contents = [self.texts[row][col], images_row[col], 'passed']
                 self.cells[row][col].set_control(contents)
 
-    # определить координаты левого верхнего угла ячейки по ее положению на доске
+    # определить координаты центра ячейки по ее положению на доске
     def get_pos(self, row, col):
         # row, col: ряд и колонка ячейки на доске
-        pos_x = int(self.left + col * np.sqrt(3) * self.radius)
-        pos_y = int(self.bottom - self.radius * (2 * row + abs(col - self.middle_n)))
-        return pos_x, pos_y
+        return self.geometry.get_pos(row, col)
+
+    def cell_at(self, pos):
+        ''' сота под точкой pos или None - по геометрии поля, без перебора сот '''
+        row_col = self.geometry.cell_at(*pos)
+        if row_col is None:
+            return None
+        return self.cells[row_col[0]][row_col[1]]
 
 
 if __name__ == '__main__':
@@ -7,46 +7,121 @@
 - загрузка списка звуковых файлов из папки path в список filelist файлов;
 - подготовка списка файлов в соответствии с состояниями
 - проигрыш звукового объекта указанное кол-во секунд по параметру state;
+- хранение коротких звуков в памяти (pygame.mixer.Sound) и их проигрыш
+  на свободных каналах микшера - звуки могут звучать одновременно;
+- потоковый проигрыш длинных звуков (фоновой музыки) через pygame.mixer.music;
+- по окончании звука в очередь событий pygame ставится событие SOUND_END;
+- чтение всех коротких звуков заранее (метод preload), в том числе в фоне во время игры;
+- перечитывание одного звука после изменения его файла: метод reload;
 
 '''
-import numpy as np
 import os
 import pygame
 
+# событие окончания проигрыша звука
+SOUND_END = pygame.USEREVENT + 1
+
 
 class SoundData:
-    def __init__(self, path='.\sounds'):
-        ''' Чтение файлов из папки path; в папке могут быть только звучки и папки '''
+    def __init__(self, path=os.path.join('.', 'sounds'), cached=True, preload=False,
+                 channels=8, music_states=(6,), max_sound_bytes=1024 * 1024):
+        ''' Чтение файлов из папки path; в папке могут быть только звучки и папки
+        :param cached: хранить звуки в памяти и играть их на каналах микшера;
+                       иначе - каждый раз читать файл через pygame.mixer.music
+        :param preload: прочитать все звуки сразу, а не при первом проигрыше
+        :param channels: количество каналов микшера для одновременных звуков
+        :param music_states: состояния, звуки которых всегда играются потоком (фоновая музыка)
+        :param max_sound_bytes: файлы больше этого размера тоже играются потоком
+        '''
         self.path = path
-        file_list = os.listdir(path)
-        file_list = [x for x in file_list if os.path.isfile(os.path.join(path, x))]
-        self.filelist = [x for x in file_list if self.get_state(x) is not None]
-        if self.filelist:
-            self.init_to_game()
+        self.cached = cached
+        self.music_states = set(music_states)
+        self.max_sound_bytes = max_sound_bytes
+        # state -> pygame.mixer.Sound; None - звук играется потоком
+        self.sounds = {}
+        self.filelist = self.list_files()
+        self.init_to_game()
+        if pygame.mixer.get_init():
+            pygame.mixer.music.set_endevent(SOUND_END)
+            if cached:
+                pygame.mixer.set_num_channels(channels)
+                if preload:
+                    self.preload()
 
     def get_state(self, filename):
-        name, extname = filename.split('.')
         try:
+            name, extname = filename.split('.')
             _, state = name.split('_')
             state = int(state)
             return state
         except:
             return None
 
+    def list_files(self):
+        file_list = os.listdir(self.path)
+        file_list = [x for x in file_list if os.path.isfile(os.path.join(self.path, x))]
+        return [x for x in file_list if self.get_state(x) is not None]
+
+    def reload(self, state):
+        ''' перечитать звук состояния state после изменения его файла; остальные не трогаем '''
+        self.filelist = self.list_files()
+        self.init_to_game()
+        self.sounds.pop(state, None)
+        if self.cached and pygame.mixer.get_init() and state in self.access:
+            self.get_sound(state)
+
+    def preload(self):
+        ''' прочитать в память все короткие звуки (можно в фоновом потоке) '''
+        if self.cached and pygame.mixer.get_init():
+            for state in list(self.access):
+                self.get_sound(state)
+
     def init_to_game(self):
-        # определяем максимальные индексы строк и столбцов по именам
-        self.access = np.zeros(len(self.filelist), dtype=np.int16)
-        # наполняем массив номеров звуков в зависимости от индексов
-        for nom, filename in enumerate(self.filelist):
-            state = self.get_state(filename)
-            self.access[state] = nom
+        # state -> имя файла; номера состояний могут идти с пропусками,
+        # а файлы - удаляться и добавляться во время игры (метод reload)
+        self.access = {self.get_state(filename): filename for filename in self.filelist}
 
-    def play_sound(self, state):
-        filename = self.filelist[self.access[state]]
-        fullname = os.path.join(self.path, filename)
+    def get_fullname(self, state):
+        ''' полное имя файла звука состояния state или None, если такого файла нет '''
+        filename = self.access.get(state)
+        if filename is None:
+            return None
+        return os.path.join(self.path, filename)
+
+    def get_sound(self, state):
+        ''' звук состояния state в памяти или None, если он играется потоком '''
+        if state in self.sounds:
+            return self.sounds[state]
+        sound = None
+        fullname = self.get_fullname(state)
+        if fullname is None:
+            return None
+        if state not in self.music_states and os.path.getsize(fullname) <= self.max_sound_bytes:
+            try:
+                sound = pygame.mixer.Sound(fullname)
+            except pygame.error:
+                # формат не поддерживается для Sound - остается потоковый проигрыш
+                sound = None
+        self.sounds[state] = sound
+        return sound
+
+    def play_music(self, state):
+        fullname = self.get_fullname(state)
+        if fullname is None:
+            return
         pygame.mixer.music.load(fullname)
         pygame.mixer.music.play()
 
+    def play_sound(self, state):
+        sound = self.get_sound(state) if self.cached else None
+        if sound is None:
+            self.play_music(state)
+            return
+        # свободный канал, а если все заняты - тот, что звучит дольше всех
+        channel = pygame.mixer.find_channel(True)
+        channel.set_endevent(SOUND_END)
+        channel.play(sound)
+
 
 if __name__ == '__main__':
     pygame.init()
@@ -0,0 +1,71 @@
+''' Модуль слежения за изменением файлов игры (без pygame и внешних служб)
+Основной функционал модуля (класса FileWatcher):
+- снимок времени изменения и размера файлов в заданных папках (и их подпапках -
+  в них лежат кадры анимаций эмоций) и отдельных файлов;
+- периодическое сравнение со снимком: список измененных, новых и удаленных файлов;
+- время до следующей проверки для планировщика режима простоя (метод frame_timeout);
+
+Что делать с измененными файлами, решает игра (Game.reload_assets).
+'''
+import os
+
+
+class FileWatcher:
+    def __init__(self, paths, interval=500, now=0):
+        ''' :param paths: папки и файлы, за которыми следим
+        :param interval: период проверки, мс
+        :param now: текущее время, мс (часы задает вызывающий, например pygame.time.get_ticks)
+        '''
+        self.paths = list(paths)
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.next_check = now + interval
+
+    @staticmethod
+    def stat(entry):
+        ''' (время изменения, размер) файла entry (DirEntry или путь);
+        None - если файл успели удалить (временные файлы редакторов)
+        '''
+        try:
+            stat = entry.stat() if isinstance(entry, os.DirEntry) else os.stat(entry)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def scan(self):
+        ''' {путь: (время изменения, размер)} для всех файлов; файлы, удаленные
+        во время просмотра папки, в снимок не попадают
+        '''
+        files = {}
+        for path in self.paths:
+            if os.path.isfile(path):
+                files[path] = self.stat(path)
+            elif os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            files[entry.path] = self.stat(entry)
+                        elif entry.is_dir():
+                            try:
+                                with os.scandir(entry.path) as subentries:
+                                    for subentry in subentries:
+                                        if subentry.is_file():
+                                            files[subentry.path] = self.stat(subentry)
+                            except FileNotFoundError:
+                                pass
+        return {path: stat for path, stat in files.items() if stat is not None}
+
+    def frame_timeout(self, now):
+        ''' через сколько мс следующая проверка '''
+        return max(self.next_check - now, 0)
+
+    def poll(self, now):
+        ''' если подошло время - проверить файлы; вернуть список измененных путей '''
+        if now < self.next_check:
+            return []
+        self.next_check = now + self.interval
+        snapshot = self.scan()
+        changed = [path for path, stat in snapshot.items() if self.snapshot.get(path) != stat]
+        changed += [path for path in self.snapshot if path not in snapshot]
+        self.snapshot = snapshot
+        return sorted(changed)